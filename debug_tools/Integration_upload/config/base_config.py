@@ -6,7 +6,7 @@
 import os
 from abc import ABC
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Set, Tuple
 
 
 class BaseUploadConfig(ABC):
@@ -26,13 +26,27 @@ class BaseUploadConfig(ABC):
     UPLOAD_BEHAVIOR: Dict[str, Any] = {
         'skip_existing': True,          # 是否跳過已存在的檔案（根據雜湊值判斷）
         'check_duplicates': True,       # 是否檢查重複檔案
-        'concurrent_uploads': 3,        # 並行上傳數量
+        # 雜湊計算為 CPU 密集（行程池，約等於核心數即飽和）；上傳為 I/O 密集（執行緒池，可開到 8–32）
+        # 並行上傳執行緒數，0 為自動（min(32, 4 × CPU 核心數)）；'auto' 為上傳前量測頻寬後決定（2–16）
+        'concurrent_uploads': 3,
+        'hash_workers': 0,              # 並行雜湊計算的行程數，0 為 CPU 核心數
+        'discovery_workers': 0,         # 掃描時平行走訪第一層子資料夾的執行緒數，0 為自動（16），1 為單執行緒
         'retry_attempts': 3,            # 失敗重試次數
-        'retry_delay': 2,               # 重試延遲（秒）
+        'retry_delay': 2,               # 重試延遲基準（秒），第 n 次重試等待 retry_delay × 2^n 加上隨機抖動
+        'max_inflight_mb': 0,           # 同時上傳中的檔案總大小上限（MB），避免壅塞時大量重試，0 為不限制
         # 'per_label_limit': 0,           # 限制每個 label 上傳數量，0 為不限制
         # 'per_label_limit': 2,           # 限制每個 label 上傳數量，0 為不限制
         'per_label_limit': 2,           # 限制每個 label 上傳數量，0 為不限制
         # 'per_label_limit': 200,           # 限制每個 label 上傳數量，0 為不限制
+        'max_file_size_mb': 0,          # 單檔大小上限（MB），超過即略過，0 為不限制
+        # 建立 info_features.file_hash 唯一索引，由伺服器拒絕重複檔案（既有資料已有重複或需保留重複時請勿啟用）
+        'unique_file_hash_index': False,
+        # 進度記錄檔每追加多少筆執行一次 fsync（0 為不 fsync，僅 flush 至作業系統；斷電時遺失的進度會由資料庫查重補回）
+        'progress_fsync_every': 0,
+        # 檔案大小與資料庫中所有記錄（info_features.file_size）都不同時，不需先計算雜湊比對即可直接上傳
+        # 啟用時建立 info_features.file_size 索引，只以 $in 查詢本次檔案的大小
+        # （未記錄 file_size 的既有文件無法以此比對，集合中有其他來源的記錄時請勿啟用）
+        'size_prefilter': False,
     }
 
     # ==================== 日誌配置 ====================
@@ -56,6 +70,16 @@ class BaseUploadConfig(ABC):
 
     # ==================== GridFS 配置 ====================
     USE_GRIDFS: bool = True
+    # GridFS 內容壓縮：None 為不壓縮，'zstd' 需安裝 zstandard
+    # 啟用後 GridFS metadata 會帶 compression / orig_size，讀取端必須先解壓縮
+    GRIDFS_COMPRESSION: Optional[str] = None
+    # GridFS 區塊大小（KB）；較大區塊可減少區塊文件數（pymongo 預設為 255），區塊寫入本身已批次進行
+    GRIDFS_CHUNK_SIZE_KB: int = 1024
+
+    # ==================== 檔案去重雜湊 ====================
+    # 'sha256'（預設）、'blake3'（需安裝 blake3）或 'xxh3_128'（需安裝 xxhash）
+    # 非 sha256 時 info_features 會帶 file_hash_algorithm；切換演算法後無法與先前上傳的檔案比對去重
+    HASH_ALGORITHM: str = 'sha256'
 
     # ==================== Dry Run 預覽輸出 ====================
     DRY_RUN_PREVIEW: Dict[str, Any] = {
@@ -96,33 +120,64 @@ class BaseUploadConfig(ABC):
         # 檢查上傳資料夾
         if cls.UPLOAD_DIRECTORY:
             upload_path = cls.get_upload_path()
-            if not upload_path.exists():
+            # 單次 os.scandir 同時判斷資料夾是否存在、是否有項目並取得子資料夾名稱
+            listing = cls._list_upload_folder(upload_path)
+            if listing is None:
                 errors.append(f"找不到上傳資料夾：{upload_path}")
-            elif not any(upload_path.glob('**/*')):
-                errors.append(f"上傳資料夾沒有檔案：{upload_path}")
+                folder_names: Set[str] = set()
+            else:
+                has_entries, folder_names = listing
+                if not has_entries:
+                    errors.append(f"上傳資料夾沒有檔案：{upload_path}")
 
             # 檢查標籤資料夾（可被子類別覆寫）
-            errors.extend(cls._validate_label_folders(upload_path))
+            errors.extend(cls._validate_label_folders(upload_path, folder_names))
 
         return errors
 
+    @staticmethod
+    def _list_upload_folder(upload_path: Path) -> Optional[Tuple[bool, Set[str]]]:
+        """
+        以單次 os.scandir 列出上傳資料夾第一層
+        子資料夾判斷不跟隨符號連結，與上傳器走訪資料夾的方式一致；名稱轉為小寫供不分大小寫比對
+
+        Args:
+            upload_path: 上傳資料夾路徑
+
+        Returns:
+            (是否有任何項目, 子資料夾名稱集合) tuple，資料夾不存在時為 None
+        """
+        has_entries = False
+        folder_names: Set[str] = set()
+        try:
+            with os.scandir(upload_path) as entries:
+                for entry in entries:
+                    has_entries = True
+                    if entry.is_dir(follow_symlinks=False):
+                        folder_names.add(entry.name.lower())
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        except OSError:
+            pass
+        return has_entries, folder_names
+
     @classmethod
-    def _validate_label_folders(cls, upload_path: Path) -> List[str]:
+    def _validate_label_folders(cls, upload_path: Path, folder_names: Set[str]) -> List[str]:
         """
-        驗證標籤資料夾是否存在
+        驗證標籤資料夾是否存在（與已列出的子資料夾名稱比對，不另外 stat）
         子類別可以覆寫此方法以跳過或自訂驗證邏輯
 
         Args:
             upload_path: 上傳資料夾路徑
+            folder_names: 上傳資料夾第一層的子資料夾名稱（小寫）
 
         Returns:
             錯誤訊息列表
         """
         errors: List[str] = []
         for label, folder_name in cls.LABEL_FOLDERS.items():
-            folder_path = upload_path / folder_name
-            if not folder_path.is_dir():
-                errors.append(f"找不到標籤「{label}」對應的資料夾：{folder_path}")
+            if folder_name.lower() not in folder_names:
+                errors.append(f"找不到標籤「{label}」對應的資料夾：{upload_path / folder_name}")
         return errors
 
     @classmethod
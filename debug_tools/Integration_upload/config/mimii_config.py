@@ -4,7 +4,7 @@ MIMII 資料集配置
 """
 
 from pathlib import Path
-from typing import List
+from typing import List, Set
 
 from .base_config import BaseUploadConfig
 
@@ -42,13 +42,14 @@ class MIMIIUploadConfig(BaseUploadConfig):
     }
 
     @classmethod
-    def _validate_label_folders(cls, upload_path: Path) -> List[str]:
+    def _validate_label_folders(cls, upload_path: Path, folder_names: Set[str]) -> List[str]:
         """
         MIMII 資料集的標籤資料夾在深層目錄中，不需要檢查
         標籤資料夾結構：{snr}_{machine_type}/{machine_type}/{obj_ID}/{label}/
 
         Args:
             upload_path: 上傳資料夾路徑（未使用）
+            folder_names: 上傳資料夾第一層的子資料夾名稱（未使用）
 
         Returns:
             空列表（不執行驗證）
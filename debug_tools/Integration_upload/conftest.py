@@ -0,0 +1,123 @@
+"""
+測試共用的 fixture
+以記憶體中的集合取代 MongoDB 連線，上傳器的測試不需要實際的 MongoDB 伺服器
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from .core.mongodb_handler import MongoDBUploader
+
+
+def _get_field(document: Dict[str, Any], dotted_key: str) -> Any:
+    """依點分隔的欄位名稱取值"""
+    value: Any = document
+    for key in dotted_key.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def _matches(document: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    """支援測試所需的查詢條件：相等、$in、$ne、$exists"""
+    for key, condition in query.items():
+        value = _get_field(document, key)
+        if isinstance(condition, dict):
+            if '$in' in condition and value not in condition['$in']:
+                return False
+            if '$ne' in condition and value == condition['$ne']:
+                return False
+            if '$exists' in condition and (value is not None) != condition['$exists']:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    """記憶體中的集合，記錄查詢與索引，可設定下一次 insert_many 的寫入錯誤"""
+
+    def __init__(self) -> None:
+        self.documents: List[Dict[str, Any]] = []
+        self.queries: List[Dict[str, Any]] = []
+        self.indexes: List[str] = []
+        # 下一次 insert_many 要回報的 writeErrors（依批次內索引）
+        self.write_errors: List[Dict[str, Any]] = []
+
+    def create_index(self, keys, **options) -> str:
+        self.indexes.append(options['name'])
+        return options['name']
+
+    def insert_many(self, documents, ordered: bool = True):
+        errors, self.write_errors = self.write_errors, []
+        failed = {error['index'] for error in errors}
+        self.documents.extend(document for idx, document in enumerate(documents) if idx not in failed)
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'nInserted': len(documents) - len(failed)})
+
+    def find(self, query: Optional[Dict[str, Any]] = None, projection=None, **kwargs):
+        query = query or {}
+        self.queries.append(query)
+        return [document for document in self.documents if _matches(document, query)]
+
+    def find_one(self, query: Optional[Dict[str, Any]] = None, projection=None, **kwargs):
+        found = self.find(query)
+        return found[0] if found else None
+
+
+@pytest.fixture
+def fake_collection(monkeypatch) -> FakeCollection:
+    """以 FakeCollection 取代 MongoDBUploader 的連線（不使用 GridFS）"""
+    collection = FakeCollection()
+
+    def _connect(self: MongoDBUploader) -> None:
+        self.mongo_client = None
+        self.db = None
+        self.collection = collection
+        self._bulk_collection = collection
+        self._find_one = collection.find_one
+        self._insert_many = collection.insert_many
+        self.fs = None
+        self._ensure_indexes()
+
+    monkeypatch.setattr(MongoDBUploader, '_connect', _connect)
+    return collection
+
+
+@pytest.fixture
+def test_logger() -> logging.Logger:
+    """不輸出到檔案的記錄器"""
+    logger = logging.getLogger('integration_upload_tests')
+    logger.setLevel(logging.DEBUG)
+    return logger
+
+
+@pytest.fixture
+def make_uploader(monkeypatch, tmp_path, fake_collection, test_logger):
+    """
+    建立指向暫存資料夾的上傳器（進度檔寫入 tmp_path，不使用 GridFS），測試結束時呼叫 cleanup
+    關鍵字參數會覆寫配置的 UPLOAD_BEHAVIOR
+    """
+    created = []
+
+    def _make(uploader_class: type, config_class: type, upload_directory: str, **upload_behavior: Any):
+        monkeypatch.setattr(config_class, 'UPLOAD_DIRECTORY', upload_directory)
+        monkeypatch.setattr(config_class, 'PROGRESS_FILE', str(tmp_path / 'reports' / 'upload_progress.json'))
+        monkeypatch.setattr(config_class, 'USE_GRIDFS', False)
+        monkeypatch.setattr(config_class, 'UPLOAD_BEHAVIOR', {
+            **config_class.UPLOAD_BEHAVIOR,
+            'per_label_limit': 0,
+            'concurrent_uploads': 1,
+            **upload_behavior,
+        })
+        uploader = uploader_class(test_logger)
+        created.append(uploader)
+        return uploader
+
+    yield _make
+    for uploader in created:
+        uploader.cleanup()
@@ -5,20 +5,33 @@
 
 from __future__ import annotations
 
-import json
+import atexit
 import logging
+import math
+import os
 import random
+import threading
 import time
 from abc import ABC, abstractmethod
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Tuple, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO, Tuple
 
 from tqdm import tqdm
 
 from .mongodb_handler import MongoDBUploader
-from .utils import calculate_file_hash, to_json_serializable
+from .utils import (
+    DEFAULT_HASH_ALGORITHM,
+    calculate_file_hash,
+    calculate_file_hashes,
+    describe_hash_backend,
+    get_progress_log_path,
+    hash_algorithm_available,
+    read_and_hash_file,
+    read_json_file,
+    write_json_file,
+)
 
 
 class BaseBatchUploader(ABC):
@@ -27,6 +40,35 @@ class BaseBatchUploader(ABC):
     使用模板方法模式定義上傳流程
     """
 
+    # get_file_metadata 在未提供 file_data 時是否需要讀取整個檔案（而非只讀標頭）
+    METADATA_READS_CONTENT: bool = False
+
+    # 行程池每個雜湊任務最多包含的檔案數
+    HASH_BATCH_MAX_FILES = 64
+
+    # 平行走訪第一層子資料夾的預設最大執行緒數（UPLOAD_BEHAVIOR['discovery_workers'] 為 0 時使用）
+    SCAN_MAX_WORKERS = 16
+
+    # scan_directory 期間累計的額外統計欄位（沿用其他上傳器的掃描結果時一併還原）
+    SCAN_STATS_KEYS: Tuple[str, ...] = ()
+
+    # 上傳執行緒池中同時排隊的檔案數上限（執行緒數的倍數）
+    UPLOAD_QUEUE_FACTOR = 2
+
+    # concurrent_uploads 為 'auto' 時：量測頻寬的測試資料大小與執行緒數上限
+    UPLOAD_CALIBRATION_BYTES = 4 * 1024 * 1024
+    AUTO_UPLOAD_SLOTS_MAX = 16
+
+    # 進度條統計數字的更新間隔（秒）
+    POSTFIX_INTERVAL = 0.5
+
+    # 進度記錄檔累積多少筆或經過多少秒才 flush 一次（中斷時最多遺失這些筆，重跑時會由資料庫查重補回）
+    PROGRESS_FLUSH_EVERY = 50
+    PROGRESS_FLUSH_INTERVAL = 1.0
+    # 進度記錄檔追加超過 max(此筆數, 已上傳總數) 時，於上傳期間壓實回 JSON 進度檔並清空記錄檔
+    # 壓實間隔隨總數成長，整次執行重寫 JSON 的總成本仍與檔案數成線性，記錄檔大小也有上限
+    PROGRESS_COMPACT_EVERY = 5000
+
     def __init__(
         self,
         config_class: type,
@@ -44,12 +86,76 @@ class BaseBatchUploader(ABC):
         self.config = config_class
         self.logger = logger
         self.dataset_name = dataset_name
+        # 小寫副檔名集合，掃描時只取最後一個 '.' 之後的部分轉小寫查詢（O(1)）
+        self._supported_suffixes = frozenset(ext.lower() for ext in self.config.SUPPORTED_FORMATS)
+        # 上傳資料夾路徑前綴（含結尾分隔符號），以字串前綴比對取得相對路徑
+        # '.' 時 os.scandir 產生的 './x' 與 Path 正規化後的 'x' 不同，改以絕對路徑掃描（見 _scan_root），前綴亦為絕對路徑
+        upload_dir = str(Path(self.config.UPLOAD_DIRECTORY))
+        if upload_dir == os.curdir:
+            upload_dir = os.path.abspath(upload_dir)
+        self._upload_dir_prefix = os.path.join(upload_dir, '')
+        # 對應的絕對路徑前綴，掃描結果可直接串接成雜湊快取鍵值，不需逐檔 os.path.abspath（相對路徑時每次都會呼叫 getcwd）
+        self._upload_dir_abs_prefix = os.path.join(os.path.abspath(upload_dir), '')
+
+        # 上傳行為設定（每個檔案都會用到，初始化時讀取一次）
+        upload_behavior = self.config.UPLOAD_BEHAVIOR
+        self._skip_existing: bool = upload_behavior['skip_existing']
+        self._check_duplicates: bool = upload_behavior['check_duplicates']
+        self._retry_attempts: int = upload_behavior['retry_attempts']
+        self._retry_delay: float = upload_behavior['retry_delay']
+        # 同時上傳中的位元組數上限（0 為不限制）
+        self._inflight_limit: int = int(upload_behavior.get('max_inflight_mb', 0) * 1024 * 1024)
+        self._inflight_bytes = 0
+        self._inflight_condition = threading.Condition()
+        cpu_count = os.cpu_count() or 1
+        # 上傳為 I/O 密集，執行緒數可高於核心數；雜湊為 CPU 密集，行程數以核心數為上限
+        concurrent_uploads = upload_behavior['concurrent_uploads']
+        # 'auto' 於正式上傳前量測頻寬決定執行緒數；量測失敗時沿用 0 的自動值
+        self._calibrate_uploads: bool = concurrent_uploads == 'auto'
+        if self._calibrate_uploads:
+            concurrent_uploads = 0
+        self._concurrent_uploads: int = concurrent_uploads or min(32, 4 * cpu_count)
+        self._hash_workers: int = upload_behavior.get('hash_workers') or cpu_count
+        self._discovery_workers: int = upload_behavior.get('discovery_workers') or self.SCAN_MAX_WORKERS
+        self._max_file_bytes: int = int(upload_behavior.get('max_file_size_mb', 0) * 1024 * 1024)
+        # 末端資料夾（_is_leaf_folder）最多收集的檔案數：末端資料夾的標籤固定且有效，標籤上限採樣只會取用
+        # 每個資料夾掃描順序中的前 per_label_limit 個，其餘不需 stat 也不會進入後續流程
+        # 其他資料夾的檔案仍可能在標籤解析時被排除，因此不設上限
+        per_label_limit = upload_behavior.get('per_label_limit', 0)
+        self._folder_file_limit: int = per_label_limit if isinstance(per_label_limit, int) and per_label_limit > 0 else 0
+        # 依資料集目錄結構於建構時決定走訪方式：未覆寫 _is_leaf_folder 的資料集完整遞迴，掃描每個資料夾時不需呼叫判斷
+        self._leaf_folder_check: Optional[Callable[[str], bool]] = (
+            None if type(self)._is_leaf_folder is BaseBatchUploader._is_leaf_folder else self._is_leaf_folder
+        )
+        self._progress_fsync_every: int = upload_behavior.get('progress_fsync_every', 0)
+        # 不需先以雜湊判斷是否略過時，於上傳的同一次讀取中計算雜湊
+        self._fuse_hash_upload: bool = not self._skip_existing and not self.METADATA_READS_CONTENT
+        # 大小預先篩選：資料庫與本次上傳中都沒有相同大小的檔案不可能重複，不需先計算雜湊
+        self._size_prefilter: bool = self._skip_existing and upload_behavior.get('size_prefilter', False)
+        self._known_sizes: Optional[set] = None
+        # 已向資料庫查詢過的檔案大小；不在其中的大小（例如掃描後才變動的檔案）不可略過預先雜湊
+        self._checked_sizes: set = set()
+        self._unique_size_files: set = set()
+
+        # 檔案去重雜湊演算法
+        self._hash_algorithm: str = getattr(self.config, 'HASH_ALGORITHM', DEFAULT_HASH_ALGORITHM)
+        if not hash_algorithm_available(self._hash_algorithm):
+            self.logger.warning(f"雜湊演算法 {self._hash_algorithm} 不受支援或未安裝所需套件，改用 SHA-256")
+            self._hash_algorithm = DEFAULT_HASH_ALGORITHM
+        self.logger.debug("雜湊實作：%s", describe_hash_backend(self._hash_algorithm))
 
         # 初始化 MongoDB 上傳器
         self.uploader = MongoDBUploader(
             mongodb_config=self.config.MONGODB_CONFIG,
             use_gridfs=self.config.USE_GRIDFS,
-            logger=self.logger
+            logger=self.logger,
+            concurrency=self._concurrent_uploads,
+            compression=self.config.GRIDFS_COMPRESSION,
+            hash_algorithm=self._hash_algorithm,
+            unique_file_hash=upload_behavior.get('unique_file_hash_index', False),
+            chunk_size=getattr(self.config, 'GRIDFS_CHUNK_SIZE_KB', 0) * 1024 or None,
+            file_size_index=self._size_prefilter,
+            on_timed_flush=self._apply_insert_results
         )
 
         # 初始化統計資料
@@ -62,60 +168,425 @@ class BaseBatchUploader(ABC):
             'failed_files': [],
         }
 
-        # 載入進度
+        # 已排入批次寫入、尚待確認的檔案（AnalyzeUUID -> 檔案路徑）
+        self._queued_files: Dict[str, Path] = {}
+        # 上傳執行緒與批次寫入計時器都會更新 stats 與 _queued_files，以同一把鎖保護
+        self._stats_lock = threading.Lock()
+
+        # 掃描時取得的 (檔案大小, mtime_ns)，供雜湊快取比對，避免再次 stat
+        self._scan_stats: Dict[str, Tuple[int, int]] = {}
+        # discover_files 的結果（掃描或由 adopt_scan_result 取得後沿用）
+        self._discovered_files: Optional[List[Tuple[Path, str, Optional[Dict[str, Any]]]]] = None
+
+        # 載入進度（uploaded_files 於執行期間為 set，寫入檔案時轉為 list）
+        # 上傳期間只追加至記錄檔，結束時才壓實回 JSON 進度檔
+        self._progress_lock = threading.Lock()
+        self._progress_path = Path(self.config.PROGRESS_FILE)
+        self._progress_path.parent.mkdir(parents=True, exist_ok=True)
+        self._progress_tmp_path = self._progress_path.with_name(f"{self._progress_path.name}.tmp")
+        self._progress_log_path = get_progress_log_path(self._progress_path, self.dataset_name)
+        self._progress_log: Optional[TextIO] = None
+        self._progress_unflushed = 0
+        self._progress_unsynced = 0
+        self._progress_logged = 0
+        self._progress_last_flush = time.monotonic()
         self.progress = self._load_progress()
+        # 雜湊快取：絕對路徑 -> [檔案大小, mtime_ns, 雜湊值(, 演算法)]，大小與修改時間相同時不再重新計算
+        # 演算法欄位只在非 sha256 時寫入
+        self._hash_cache: Dict[str, List[Any]] = self.progress['hash_cache']
+        self._hash_cache_dirty = False
+        # 程序結束（含 Ctrl+C 後的 sys.exit）時壓實進度
+        atexit.register(self._flush_progress)
         self.logger.info(f"{self.dataset_name} 批次上傳器已完成初始化。")
 
     def _load_progress(self) -> Dict[str, Any]:
-        """載入上傳進度"""
-        progress_path = Path(self.config.PROGRESS_FILE)
-        progress_path.parent.mkdir(parents=True, exist_ok=True)
-
+        """載入上傳進度（合併 JSON 進度檔與尚未壓實的追加記錄檔）"""
+        progress_path = self._progress_path
+        progress: Dict[str, Any] = {'uploaded_files': set(), 'hash_cache': {}}
         if progress_path.exists():
             try:
-                with progress_path.open('r', encoding='utf-8') as handle:
-                    data = json.load(handle)
-                    # 確保有 dataset 區分
-                    if 'datasets' not in data:
-                        # 舊格式轉換
-                        data = {
-                            'datasets': {
-                                self.dataset_name: {'uploaded_files': data.get('uploaded_files', [])}
-                            }
+                data = read_json_file(progress_path)
+                # 確保有 dataset 區分
+                if 'datasets' not in data:
+                    # 舊格式轉換
+                    data = {
+                        'datasets': {
+                            self.dataset_name: {'uploaded_files': data.get('uploaded_files', [])}
                         }
-                    if self.dataset_name not in data['datasets']:
-                        data['datasets'][self.dataset_name] = {'uploaded_files': []}
-                    return data['datasets'][self.dataset_name]
+                    }
+                if self.dataset_name not in data['datasets']:
+                    data['datasets'][self.dataset_name] = {'uploaded_files': []}
+                progress = data['datasets'][self.dataset_name]
+                progress['uploaded_files'] = set(progress.get('uploaded_files', []))
+                progress['hash_cache'] = progress.get('hash_cache') or {}
             except Exception as exc:
                 self.logger.warning(f"無法載入進度檔案：{exc}")
 
-        return {'uploaded_files': []}
+        try:
+            log_text = self._progress_log_path.read_bytes().decode('utf-8', errors='replace')
+        except FileNotFoundError:
+            log_text = ''
+        except Exception as exc:
+            self.logger.warning(f"無法載入進度記錄檔：{exc}")
+            log_text = ''
+        # 只採用以換行結尾的完整行：中斷時寫到一半的最後一行不會被當成雜湊值併入進度
+        progress['uploaded_files'].update(log_text[:log_text.rfind('\n') + 1].split())
 
-    def _save_progress(self) -> None:
-        """儲存上傳進度"""
+        return progress
+
+    def _write_progress_snapshot(self) -> bool:
+        """
+        將目前進度寫入 JSON 進度檔（呼叫端須持有 _progress_lock）
+
+        Returns:
+            是否寫入成功
+        """
         try:
-            progress_path = Path(self.config.PROGRESS_FILE)
-            progress_path.parent.mkdir(parents=True, exist_ok=True)
+            progress_path = self._progress_path
 
             # 讀取完整進度（包含所有資料集）
             full_progress = {'datasets': {}}
             if progress_path.exists():
                 try:
-                    with progress_path.open('r', encoding='utf-8') as handle:
-                        full_progress = json.load(handle)
-                        if 'datasets' not in full_progress:
-                            full_progress = {'datasets': {}}
+                    full_progress = read_json_file(progress_path)
+                    if 'datasets' not in full_progress:
+                        full_progress = {'datasets': {}}
                 except Exception:
                     pass
 
             # 更新當前資料集的進度
-            full_progress['datasets'][self.dataset_name] = self.progress
+            full_progress['datasets'][self.dataset_name] = {
+                **self.progress,
+                'uploaded_files': sorted(self.progress['uploaded_files']),
+            }
 
-            # 寫入檔案
-            with progress_path.open('w', encoding='utf-8') as handle:
-                json.dump(full_progress, handle, indent=2, ensure_ascii=False)
+            # 先寫入暫存檔再取代，避免中斷時留下不完整的進度檔
+            write_json_file(self._progress_tmp_path, full_progress)
+            os.replace(self._progress_tmp_path, progress_path)
+            return True
         except Exception as exc:
             self.logger.warning(f"無法寫入進度檔案：{exc}")
+            return False
+
+    def _save_progress(self) -> None:
+        """儲存上傳進度"""
+        with self._progress_lock:
+            self._write_progress_snapshot()
+
+    def _record_progress(self, file_hashes: List[str]) -> None:
+        """
+        記錄已上傳的檔案雜湊值
+        每筆只追加一行至進度記錄檔，不重寫整份 JSON；累積 PROGRESS_FLUSH_EVERY 筆或
+        PROGRESS_FLUSH_INTERVAL 秒才 flush 一次；設定 progress_fsync_every 時，flush 後累積達該筆數才 fsync；
+        記錄檔筆數達 PROGRESS_COMPACT_EVERY 與已上傳總數的較大者時壓實回 JSON
+
+        Args:
+            file_hashes: 雜湊值列表
+        """
+        with self._progress_lock:
+            uploaded_files = self.progress['uploaded_files']
+            new_hashes = [file_hash for file_hash in file_hashes if file_hash not in uploaded_files]
+            if not new_hashes:
+                return
+            uploaded_files.update(new_hashes)
+
+            try:
+                if self._progress_log is None:
+                    self._progress_log = self._progress_log_path.open('a', encoding='utf-8', buffering=1 << 16)
+                self._progress_log.write(''.join(f"{file_hash}\n" for file_hash in new_hashes))
+                self._progress_unflushed += len(new_hashes)
+                self._progress_logged += len(new_hashes)
+                if self._progress_logged >= max(self.PROGRESS_COMPACT_EVERY, len(uploaded_files)):
+                    self._compact_progress()
+                    return
+                now = time.monotonic()
+                if (self._progress_unflushed >= self.PROGRESS_FLUSH_EVERY
+                        or now - self._progress_last_flush >= self.PROGRESS_FLUSH_INTERVAL):
+                    self._progress_log.flush()
+                    self._progress_unsynced += self._progress_unflushed
+                    self._progress_unflushed = 0
+                    self._progress_last_flush = now
+                    if self._progress_fsync_every and self._progress_unsynced >= self._progress_fsync_every:
+                        os.fsync(self._progress_log.fileno())
+                        self._progress_unsynced = 0
+            except Exception as exc:
+                self.logger.warning(f"無法寫入進度記錄檔：{exc}")
+
+    def _flush_progress(self) -> None:
+        """壓實進度：將完整進度（含雜湊快取）寫回 JSON 進度檔並清除追加記錄檔"""
+        with self._progress_lock:
+            if self._progress_log is None and not self._hash_cache_dirty:
+                return
+            self._compact_progress()
+
+    def _compact_progress(self) -> None:
+        """
+        關閉追加記錄檔、寫入 JSON 進度檔，成功後才刪除記錄檔（呼叫端須持有 _progress_lock）
+        寫入失敗時保留記錄檔，下次載入仍可合併
+        """
+        if self._progress_log is not None:
+            self._progress_log.close()
+            self._progress_log = None
+            self._progress_unflushed = 0
+            self._progress_unsynced = 0
+            self._progress_last_flush = time.monotonic()
+
+        # 寫入失敗時同樣重新計數，避免之後每筆都重試整份重寫
+        self._progress_logged = 0
+        if self._write_progress_snapshot():
+            self._hash_cache_dirty = False
+            try:
+                self._progress_log_path.unlink(missing_ok=True)
+            except Exception as exc:
+                self.logger.warning(f"無法清除進度記錄檔：{exc}")
+
+    def _hash_cache_key(self, file_path: Path) -> Optional[Tuple[str, int, int]]:
+        """
+        取得雜湊快取的鍵值（優先使用掃描時記錄的 stat 結果）
+
+        Args:
+            file_path: 檔案路徑
+
+        Returns:
+            (絕對路徑, 檔案大小, mtime_ns) tuple，無法 stat 時為 None
+        """
+        path_str = os.fspath(file_path)
+        scan_stat = self._scan_stats.get(path_str)
+        if scan_stat is None:
+            try:
+                stat_result = os.stat(path_str)
+            except OSError:
+                return None
+            return os.path.abspath(path_str), stat_result.st_size, stat_result.st_mtime_ns
+
+        # 掃描結果皆位於上傳資料夾內，以前綴替換取得絕對路徑
+        prefix = self._upload_dir_prefix
+        if path_str.startswith(prefix):
+            absolute_path = self._upload_dir_abs_prefix + path_str[len(prefix):]
+        else:
+            absolute_path = os.path.abspath(path_str)
+        return absolute_path, scan_stat[0], scan_stat[1]
+
+    def _lookup_cached_hash(self, cache_key: Optional[Tuple[str, int, int]]) -> Optional[str]:
+        """
+        查詢雜湊快取，檔案大小、修改時間與雜湊演算法都相同時才視為命中
+
+        Args:
+            cache_key: _hash_cache_key 的回傳值
+
+        Returns:
+            快取的雜湊值，未命中時為 None
+        """
+        if cache_key is None:
+            return None
+        path_key, file_size, mtime_ns = cache_key
+        entry = self._hash_cache.get(path_key)
+        if entry and entry[0] == file_size and entry[1] == mtime_ns:
+            algorithm = entry[3] if len(entry) > 3 else DEFAULT_HASH_ALGORITHM
+            if algorithm == self._hash_algorithm:
+                return entry[2]
+        return None
+
+    def _remember_hash(self, cache_key: Optional[Tuple[str, int, int]], file_hash: str) -> None:
+        """
+        將計算好的雜湊值寫入快取（只標記為待寫入，於壓實進度時一併儲存）
+
+        Args:
+            cache_key: _hash_cache_key 的回傳值
+            file_hash: 雜湊值
+        """
+        if cache_key is None:
+            return
+        path_key, file_size, mtime_ns = cache_key
+        entry = [file_size, mtime_ns, file_hash]
+        if self._hash_algorithm != DEFAULT_HASH_ALGORITHM:
+            entry.append(self._hash_algorithm)
+        with self._progress_lock:
+            self._hash_cache[path_key] = entry
+            self._hash_cache_dirty = True
+
+    def get_cached_file_hash(self, file_path: Path) -> str:
+        """
+        取得檔案的雜湊值，快取命中時不讀取檔案
+
+        Args:
+            file_path: 檔案路徑
+
+        Returns:
+            雜湊值
+        """
+        cache_key = self._hash_cache_key(file_path)
+        file_hash = self._lookup_cached_hash(cache_key)
+        if file_hash is None:
+            file_hash = calculate_file_hash(file_path, self._hash_algorithm)
+            self._remember_hash(cache_key, file_hash)
+        return file_hash
+
+    def _iter_supported_files(self, directory_path: Path) -> Iterator[os.DirEntry]:
+        """
+        以 os.scandir 遞迴走訪資料夾，產生副檔名符合 SUPPORTED_FORMATS 的檔案
+        第一層的每個子資料夾交由執行緒池各自走訪（scandir/stat 會釋放 GIL），網路或慢速檔案系統上可重疊等待時間
+        先比對檔名再呼叫 is_file，不符合的檔案不會觸發任何 stat（d_type 不可用的檔案系統亦同）
+        DirEntry 會快取 is_file/stat 結果，不需額外的 stat 呼叫；大小與 mtime_ns 記入 _scan_stats 供雜湊快取使用
+        空檔案與超過 max_file_size_mb 的檔案在此直接略過，不會被開啟
+
+        Args:
+            directory_path: 資料夾路徑
+
+        Yields:
+            符合條件的 DirEntry
+        """
+        files, subdirectories = self._scan_folder(self._scan_root(directory_path))
+        yield from files
+
+        workers = min(self._discovery_workers, len(subdirectories))
+        if workers <= 1:
+            for subdirectory in subdirectories:
+                yield from self._walk_folder(subdirectory)
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as scan_pool:
+            for files in scan_pool.map(self._walk_folder, subdirectories):
+                yield from files
+
+    @staticmethod
+    def _scan_root(directory_path: Path) -> str:
+        """
+        取得掃描起點字串，使 DirEntry.path 與 Path(entry.path) 的字串相同（_scan_stats 的鍵值與查詢一致）
+        Path 已正規化多餘的分隔符號與 './'，只有 '.' 本身需改為絕對路徑（os.scandir('.') 會產生 './x'）
+
+        Args:
+            directory_path: 資料夾路徑
+
+        Returns:
+            掃描起點
+        """
+        root = os.fspath(directory_path)
+        return os.path.abspath(root) if root == os.curdir else root
+
+    def _walk_folder(self, root: str) -> List[os.DirEntry]:
+        """
+        遞迴走訪單一資料夾，收集符合條件的檔案
+
+        Args:
+            root: 資料夾路徑
+
+        Returns:
+            符合條件的 DirEntry 列表
+        """
+        found: List[os.DirEntry] = []
+        pending = [root]
+        while pending:
+            files, subdirectories = self._scan_folder(pending.pop())
+            found.extend(files)
+            pending.extend(subdirectories)
+        return found
+
+    def _scan_folder(self, folder: str) -> Tuple[List[os.DirEntry], List[str]]:
+        """
+        讀取單一資料夾（不遞迴），篩選符合條件的檔案並列出子資料夾
+
+        Args:
+            folder: 資料夾路徑
+
+        Returns:
+            (符合條件的 DirEntry 列表, 子資料夾路徑列表) tuple
+        """
+        suffixes = self._supported_suffixes
+        scan_stats = self._scan_stats
+        leaf_folder_check = self._leaf_folder_check
+        descend = leaf_folder_check is None or not leaf_folder_check(folder)
+        # 只在末端資料夾套用上限：先計數再做標籤解析的話，無效檔案會佔用名額
+        file_limit = 0 if descend else self._folder_file_limit
+        files: List[os.DirEntry] = []
+        subdirectories: List[str] = []
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if descend:
+                            subdirectories.append(entry.path)
+                        continue
+                    if file_limit and len(files) >= file_limit:
+                        break
+                    name = entry.name
+                    dot = name.rfind('.')
+                    if dot >= 0 and name[dot:].lower() in suffixes and entry.is_file():
+                        stat_result = entry.stat()
+                        file_size = stat_result.st_size
+                        if file_size == 0:
+                            self.logger.warning(f"略過空檔案：{entry.path}")
+                            continue
+                        if self._max_file_bytes and file_size > self._max_file_bytes:
+                            self.logger.warning(f"略過超過大小上限的檔案：{entry.path}")
+                            continue
+                        scan_stats[entry.path] = (file_size, stat_result.st_mtime_ns)
+                        files.append(entry)
+        except OSError as exc:
+            self.logger.warning(f"無法讀取資料夾：{exc}")
+        return files, subdirectories
+
+    @property
+    def caps_leaf_folder_files(self) -> bool:
+        """掃描時是否只讀取每個末端資料夾的前 per_label_limit 個檔案"""
+        return bool(self._folder_file_limit) and self._leaf_folder_check is not None
+
+    def _is_leaf_folder(self, folder: str) -> bool:
+        """
+        判斷資料夾是否為末端資料夾（只收集其中的檔案，不再往下走訪子資料夾）
+        子類別可依資料集目錄結構覆寫，預設完整遞迴
+
+        Args:
+            folder: 資料夾路徑
+
+        Returns:
+            是否停止往下走訪
+        """
+        return False
+
+    def _split_relative_path(self, file_path: Path) -> Tuple[str, Tuple[str, ...]]:
+        """
+        取得檔案相對於上傳資料夾的路徑
+        以字串前綴比對與 split 取代 Path.relative_to，不建立新的 Path 物件也不觸發例外
+
+        Args:
+            file_path: 檔案路徑（掃描結果，位於上傳資料夾內）
+
+        Returns:
+            (以 / 分隔的相對路徑, 路徑各層名稱) tuple；不在上傳資料夾內時為完整路徑
+        """
+        path_str = os.fspath(file_path)
+        prefix = self._upload_dir_prefix
+        if path_str.startswith(prefix):
+            relative = path_str[len(prefix):]
+            return relative.replace("\\", "/"), tuple(relative.split(os.sep))
+        return path_str.replace("\\", "/"), file_path.parts
+
+    def _resolve_file_size(
+        self,
+        file_path: Path,
+        path_metadata: Optional[Dict[str, Any]],
+        file_data: Optional[bytes]
+    ) -> int:
+        """
+        取得檔案大小，優先使用已讀入的內容、路徑元數據或 _scan_stats 中掃描時記錄的大小，最後才呼叫 stat
+
+        Args:
+            file_path: 檔案路徑
+            path_metadata: 從路徑解析的元數據（可含 file_size；掃描結果的大小記錄於 _scan_stats）
+            file_data: 已讀入的檔案內容
+
+        Returns:
+            檔案大小（位元組）
+        """
+        if file_data is not None:
+            return len(file_data)
+        if path_metadata and path_metadata.get('file_size') is not None:
+            return path_metadata['file_size']
+        scan_stat = self._scan_stats.get(os.fspath(file_path))
+        if scan_stat is not None:
+            return scan_stat[0]
+        return file_path.stat().st_size
 
     @abstractmethod
     def scan_directory(self) -> List[Tuple[Path, str, Optional[Dict[str, Any]]]]:
@@ -129,12 +600,71 @@ class BaseBatchUploader(ABC):
         """
         pass
 
+    def discover_files(self) -> List[Tuple[Path, str, Optional[Dict[str, Any]]]]:
+        """
+        取得資料集檔案列表
+        此上傳器已掃描過或已透過 adopt_scan_result 取得掃描結果時直接沿用，不再走訪資料夾
+
+        Returns:
+            List of (file_path, label, metadata) tuples
+        """
+        if self._discovered_files is not None:
+            self.logger.info(f"沿用先前的掃描結果：{len(self._discovered_files)} 個檔案")
+            return list(self._discovered_files)
+
+        dataset_files = self.scan_directory()
+        self._discovered_files = list(dataset_files)
+        return dataset_files
+
+    def export_scan_result(self) -> Optional[Tuple[list, Dict[str, Tuple[int, int]], Dict[str, Any]]]:
+        """
+        匯出 discover_files 的掃描結果，供同一次執行中稍後建立的上傳器沿用（例如數量預覽後的正式上傳）
+
+        Returns:
+            (檔案列表, 檔案大小與 mtime_ns, 掃描統計) tuple，尚未掃描時為 None
+        """
+        if self._discovered_files is None:
+            return None
+        return (
+            list(self._discovered_files),
+            dict(self._scan_stats),
+            {key: self.stats[key] for key in self.SCAN_STATS_KEYS},
+        )
+
+    def adopt_scan_result(self, scan_result: Tuple[list, Dict[str, Tuple[int, int]], Dict[str, Any]]) -> None:
+        """
+        沿用 export_scan_result 匯出的掃描結果，之後的 discover_files 不再走訪資料夾
+
+        Args:
+            scan_result: export_scan_result 的回傳值
+        """
+        dataset_files, scan_stats, scan_counters = scan_result
+        self._discovered_files = list(dataset_files)
+        self._scan_stats.update(scan_stats)
+        self.stats.update(scan_counters)
+
+    def apply_label_limit(
+        self,
+        dataset_files: List[Tuple[Path, str, Optional[Dict[str, Any]]]]
+    ) -> List[Tuple[Path, str, Optional[Dict[str, Any]]]]:
+        """
+        依 per_label_limit 篩選檔案（與正式上傳使用相同的採樣邏輯）
+
+        Args:
+            dataset_files: 檔案列表
+
+        Returns:
+            篩選後的檔案列表
+        """
+        return self._apply_label_limit(dataset_files)
+
     @abstractmethod
     def get_file_metadata(
         self,
         file_path: Path,
         label: str,
-        path_metadata: Optional[Dict[str, Any]]
+        path_metadata: Optional[Dict[str, Any]],
+        file_data: Optional[bytes] = None
     ) -> Dict[str, Any]:
         """
         取得檔案元數據
@@ -144,6 +674,7 @@ class BaseBatchUploader(ABC):
             file_path: 檔案路徑
             label: 標籤
             path_metadata: 從路徑解析的元數據
+            file_data: 已讀入的檔案內容（提供時不再重新讀取磁碟）
 
         Returns:
             檔案元數據字典
@@ -171,6 +702,28 @@ class BaseBatchUploader(ABC):
         """
         pass
 
+    def _build_tagged_info_features(
+        self,
+        label: str,
+        file_hash: Optional[str],
+        file_metadata: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        建立 info_features，非預設雜湊演算法時附上 file_hash_algorithm
+
+        Args:
+            label: 標籤
+            file_hash: 檔案雜湊值
+            file_metadata: 檔案元數據
+
+        Returns:
+            info_features 字典
+        """
+        info_features = self.build_info_features(label, file_hash, file_metadata)
+        if self._hash_algorithm != DEFAULT_HASH_ALGORITHM:
+            info_features['file_hash_algorithm'] = self._hash_algorithm
+        return info_features
+
     def _apply_label_limit(
         self,
         dataset_files: List[Tuple[Path, str, Optional[Dict[str, Any]]]]
@@ -200,7 +753,8 @@ class BaseBatchUploader(ABC):
             label_counts[label] = count + 1
             filtered.append((file_path, label, metadata))
 
-        if filtered != dataset_files:
+        # filtered 為原列表的子序列，比較長度即可，不必逐項比較 Path 與元數據字典
+        if len(filtered) != len(dataset_files):
             self.logger.info(f"已套用每個標籤上限（{limit}），保留 {len(filtered)} 個檔案。")
 
         return filtered
@@ -209,7 +763,8 @@ class BaseBatchUploader(ABC):
         self,
         file_path: Path,
         label: str,
-        path_metadata: Optional[Dict[str, Any]] = None
+        path_metadata: Optional[Dict[str, Any]] = None,
+        file_hash: Optional[str] = None
     ) -> bool:
         """
         上傳單一檔案
@@ -218,68 +773,185 @@ class BaseBatchUploader(ABC):
             file_path: 檔案路徑
             label: 標籤
             path_metadata: 從路徑解析的元數據
+            file_hash: 預先計算的雜湊值（可選，提供時可在讀檔前判斷是否略過；
+                未提供且不需略過檢查時，於寫入 GridFS 的同一次讀取中計算）
 
         Returns:
             是否成功
         """
         try:
-            file_hash = calculate_file_hash(file_path)
-
-            # 檢查是否已上傳
-            if self.config.UPLOAD_BEHAVIOR['skip_existing']:
-                if file_hash in self.progress['uploaded_files']:
-                    self.logger.debug(f"進度檔案顯示已上傳，略過：{file_path.name}")
-                    self.stats['skipped'] += 1
-                    return True
+            file_data: Optional[bytes] = None
+            cache_key: Optional[Tuple[str, int, int]] = None
+            if file_hash is None:
+                cache_key = self._hash_cache_key(file_path)
+                file_hash = self._lookup_cached_hash(cache_key)
+                fuse_hash_upload = self._fuse_hash_upload or (
+                    not self.METADATA_READS_CONTENT
+                    and cache_key is not None
+                    and cache_key[0] in self._unique_size_files
+                )
+                if file_hash is None and not fuse_hash_upload:
+                    # 單次讀取：同時取得雜湊值與檔案內容
+                    file_hash, file_data = read_and_hash_file(file_path, self._hash_algorithm)
+                    self._remember_hash(cache_key, file_hash)
 
-                if self.uploader.file_exists(
-                    file_hash,
-                    self.config.UPLOAD_BEHAVIOR['check_duplicates']
-                ):
-                    self.logger.debug(f"資料庫中已存在相同檔案，略過：{file_path.name}")
-                    self.progress['uploaded_files'].append(file_hash)
-                    self._save_progress()
-                    self.stats['skipped'] += 1
-                    return True
+            # 檢查是否已上傳（大小預先篩選判定不可能重複的檔案於上傳時才計算雜湊，不需檢查）
+            if self._skip_existing and file_hash is not None and self._skip_if_existing(file_path, file_hash):
+                return True
 
-            # 取得檔案元數據
-            file_metadata = self.get_file_metadata(file_path, label, path_metadata)
+            # 取得檔案元數據（未預先讀入時由子類別自行讀取標頭，上傳時再串流寫入 GridFS）
+            file_metadata = self.get_file_metadata(file_path, label, path_metadata, file_data)
 
             # 重試邏輯
-            for attempt in range(self.config.UPLOAD_BEHAVIOR['retry_attempts']):
+            upload_file = self.uploader.upload_file
+            for attempt in range(self._retry_attempts):
                 # 建立 info_features
-                info_features = self.build_info_features(label, file_hash, file_metadata)
+                info_features = self._build_tagged_info_features(label, file_hash, file_metadata)
 
                 # 上傳檔案
-                analyze_uuid = self.uploader.upload_file(
-                    file_path=file_path,
-                    label=label,
-                    file_hash=file_hash,
-                    info_features=info_features,
-                    gridfs_metadata=file_metadata.get('gridfs_metadata')
-                )
+                upload_size = file_metadata.get('file_size') or 0
+                self._acquire_inflight(upload_size)
+                try:
+                    analyze_uuid = upload_file(
+                        file_path=file_path,
+                        label=label,
+                        file_hash=file_hash,
+                        info_features=info_features,
+                        gridfs_metadata=file_metadata.get('gridfs_metadata'),
+                        file_data=file_data,
+                        on_queued=lambda queued_uuid: self._register_queued_file(queued_uuid, file_path, label)
+                    )
+                finally:
+                    self._release_inflight(upload_size)
 
                 if analyze_uuid:
-                    self.logger.info(f"已上傳 {file_path.name}（標籤：{label}）")
-                    self.stats['success'] += 1
-                    self.stats['labels'][label] = self.stats['labels'].get(label, 0) + 1
-                    self.progress['uploaded_files'].append(file_hash)
-                    self._save_progress()
+                    if file_hash is None:
+                        # 雜湊值已在寫入時計算並回填
+                        self._remember_hash(cache_key, info_features['file_hash'])
+                    self.logger.info("已上傳 %s（標籤：%s）", file_path.name, label)
+                    self._apply_insert_results()
                     return True
 
-                if attempt < self.config.UPLOAD_BEHAVIOR['retry_attempts'] - 1:
-                    time.sleep(self.config.UPLOAD_BEHAVIOR['retry_delay'])
+                if attempt < self._retry_attempts - 1:
+                    # 指數退避加隨機抖動，避免多個執行緒在伺服器壅塞時同步重試
+                    time.sleep(self._retry_delay * (2 ** attempt) + random.random())
 
             self.logger.error(f"多次重試後仍無法上傳：{file_path.name}")
-            self.stats['failed'] += 1
-            self.stats['failed_files'].append(str(file_path))
+            self._count_failed(file_path)
             return False
 
         except Exception as exc:
             self.logger.error(f"上傳 {file_path.name} 時發生未預期的錯誤：{exc}")
+            self._count_failed(file_path)
+            return False
+
+    def _register_queued_file(self, analyze_uuid: str, file_path: Path, label: str) -> None:
+        """
+        文件排入批次寫入前先計為成功並登記，批次寫入結果（可能由計時器執行緒回收）才找得到對應檔案
+
+        Args:
+            analyze_uuid: 文件的 AnalyzeUUID
+            file_path: 檔案路徑
+            label: 標籤
+        """
+        with self._stats_lock:
+            self.stats['success'] += 1
+            self.stats['labels'][label] = self.stats['labels'].get(label, 0) + 1
+            self._queued_files[analyze_uuid] = file_path
+
+    def _count_failed(self, file_path: Path) -> None:
+        """將檔案計為失敗"""
+        with self._stats_lock:
             self.stats['failed'] += 1
             self.stats['failed_files'].append(str(file_path))
-            return False
+
+    def _skip_if_existing(self, file_path: Path, file_hash: str, known_only: bool = False) -> bool:
+        """
+        檔案已在進度檔或資料庫中時記為跳過
+
+        Args:
+            file_path: 檔案路徑
+            file_hash: 檔案雜湊值
+            known_only: 只依記憶體中已知的結果判斷，不查詢資料庫
+
+        Returns:
+            是否已存在（已記為跳過）
+        """
+        if file_hash in self.progress['uploaded_files']:
+            self.logger.debug("進度檔案顯示已上傳，略過：%s", file_path.name)
+            with self._stats_lock:
+                self.stats['skipped'] += 1
+            return True
+
+        if self.uploader.file_exists(file_hash, self._check_duplicates, known_only):
+            self.logger.debug("資料庫中已存在相同檔案，略過：%s", file_path.name)
+            self._record_progress([file_hash])
+            with self._stats_lock:
+                self.stats['skipped'] += 1
+            return True
+        return False
+
+    def _acquire_inflight(self, size: int) -> None:
+        """
+        等待同時上傳中的位元組數低於 max_inflight_mb 後登記本次上傳
+        單一檔案超過上限時，仍可在沒有其他上傳進行時單獨上傳
+
+        Args:
+            size: 檔案大小（位元組）
+        """
+        if not self._inflight_limit:
+            return
+        with self._inflight_condition:
+            while self._inflight_bytes and self._inflight_bytes + size > self._inflight_limit:
+                self._inflight_condition.wait()
+            self._inflight_bytes += size
+
+    def _release_inflight(self, size: int) -> None:
+        """
+        釋放上傳完成（或失敗）的位元組數
+
+        Args:
+            size: 檔案大小（位元組）
+        """
+        if not self._inflight_limit:
+            return
+        with self._inflight_condition:
+            self._inflight_bytes -= size
+            self._inflight_condition.notify_all()
+
+    def _apply_insert_results(self) -> None:
+        """
+        回收 MongoDB 批次寫入結果
+        成功寫入的檔案才記入進度；寫入失敗的檔案由成功改計為失敗；
+        被 file_hash 唯一索引拒絕的檔案由成功改計為跳過（資料庫已有相同檔案，同樣記入進度）
+        上傳執行緒與批次寫入計時器都會呼叫；文件排入前已由 _register_queued_file 計為成功並登記
+        """
+        inserted, failed, duplicates = self.uploader.drain_insert_results()
+        if not (inserted or failed or duplicates):
+            return
+
+        with self._stats_lock:
+            for document in inserted:
+                self._queued_files.pop(document['AnalyzeUUID'], None)
+            for document in duplicates:
+                file_path = self._queued_files.pop(document['AnalyzeUUID'], None)
+                label = document['info_features'].get('label')
+                self.stats['success'] -= 1
+                self.stats['labels'][label] -= 1
+                self.stats['skipped'] += 1
+                self.logger.debug("資料庫中已存在相同檔案，略過：%s", file_path or document['files']['raw']['filename'])
+            for document in failed:
+                file_path = self._queued_files.pop(document['AnalyzeUUID'], None)
+                label = document['info_features'].get('label')
+                self.stats['success'] -= 1
+                self.stats['labels'][label] -= 1
+                self.stats['failed'] += 1
+                self.stats['failed_files'].append(str(file_path or document['files']['raw']['filename']))
+
+        if inserted or duplicates:
+            self._record_progress([
+                document['info_features']['file_hash'] for document in (*inserted, *duplicates)
+            ])
 
     def _generate_dry_run_samples(
         self,
@@ -313,9 +985,9 @@ class BaseBatchUploader(ABC):
         for label, candidates in sorted(label_entries.items()):
             try:
                 sample_path, path_metadata = random.choice(candidates)
-                file_hash = calculate_file_hash(sample_path)
-                file_metadata = self.get_file_metadata(sample_path, label, path_metadata)
-                info_features = self.build_info_features(label, file_hash, file_metadata)
+                file_hash, file_data = read_and_hash_file(sample_path, self._hash_algorithm)
+                file_metadata = self.get_file_metadata(sample_path, label, path_metadata, file_data)
+                info_features = self._build_tagged_info_features(label, file_hash, file_metadata)
 
                 preview_payload = {
                     'dataset': self.dataset_name,
@@ -323,14 +995,13 @@ class BaseBatchUploader(ABC):
                     'source_file': str(sample_path),
                     'file_hash': file_hash,
                     'file_metadata': file_metadata,
-                    'info_features': to_json_serializable(info_features),
+                    'info_features': info_features,
                 }
 
                 output_filename = f"{label}_{sample_path.stem[:20]}.json"
                 output_path = preview_directory / output_filename
 
-                with output_path.open('w', encoding='utf-8') as handle:
-                    json.dump(preview_payload, handle, indent=2, ensure_ascii=False)
+                write_json_file(output_path, preview_payload)
 
                 self.logger.info(f"[模擬上傳] 已輸出預覽檔案：{output_path}")
 
@@ -339,14 +1010,173 @@ class BaseBatchUploader(ABC):
 
         self.logger.info(f"[模擬上傳] 預覽檔案儲存於：{preview_directory}")
 
+    def _calibrate_concurrent_uploads(self) -> None:
+        """
+        量測上傳頻寬並據以決定並行上傳執行緒數（只在第一次正式上傳前執行）
+        頻寬較低時執行緒過多只會互相爭用連線，反而降低總吞吐量
+        """
+        self._calibrate_uploads = False
+        rate = self.uploader.measure_upload_bandwidth(self.UPLOAD_CALIBRATION_BYTES)
+        if rate is None:
+            self.logger.info(f"無法量測上傳頻寬，使用 {self._concurrent_uploads} 個上傳執行緒")
+            return
+        self._concurrent_uploads = self._upload_slots_for_rate(rate)
+        self.logger.info(f"量測上傳頻寬約 {rate:.1f} MB/s，使用 {self._concurrent_uploads} 個上傳執行緒")
+
+    @classmethod
+    def _upload_slots_for_rate(cls, rate: float) -> int:
+        """
+        依上傳頻寬決定並行上傳數（分段公式，高頻寬時以平方根緩慢增加）
+
+        Args:
+            rate: 上傳速率（MB/s）
+
+        Returns:
+            並行上傳執行緒數
+        """
+        if rate < 9:
+            return 2
+        if rate < 15:
+            return 3
+        if rate < 42:
+            return 4
+        return min(cls.AUTO_UPLOAD_SLOTS_MAX, int(math.sqrt(rate * 0.6)))
+
+    def _claim_unique_size(self, cache_key: Optional[Tuple[str, int, int]]) -> bool:
+        """
+        大小預先篩選：判斷檔案大小是否與資料庫及本次先前處理的檔案都不同
+        依檔案順序逐一登記大小，同大小的第二個檔案起仍需先計算雜湊比對
+
+        Args:
+            cache_key: 雜湊快取鍵值（絕對路徑, 檔案大小, mtime_ns）
+
+        Returns:
+            是否可略過預先雜湊
+        """
+        if self._known_sizes is None or cache_key is None:
+            return False
+        file_size = cache_key[1]
+        if file_size in self._known_sizes or file_size not in self._checked_sizes:
+            return False
+        self._known_sizes.add(file_size)
+        self._unique_size_files.add(cache_key[0])
+        return True
+
+    def _iter_file_hashes(
+        self,
+        dataset_files: List[Tuple[Path, str, Optional[Dict[str, Any]]]]
+    ) -> Iterator[Tuple[Path, str, Optional[Dict[str, Any]], Optional[str]]]:
+        """
+        產生每個檔案的雜湊值
+        雜湊快取命中的檔案先行產生；其餘分批交由行程池計算（CPU 密集，繞過 GIL），依批次完成順序產生
+        每批約為 檔案數 / (行程數 × 4)，上限 HASH_BATCH_MAX_FILES，小檔案較多時可攤銷 IPC 成本
+        依檔案大小由大到小分批，讓各行程的工作量較平均
+        全部命中時不會啟動行程池；雜湊與上傳合併進行時，或大小預先篩選判定不可能重複時，未命中者直接產生 None
+
+        Args:
+            dataset_files: 檔案列表
+
+        Yields:
+            (file_path, label, metadata, file_hash) tuple，計算失敗時 file_hash 為 None
+        """
+        misses: List[Tuple[Path, str, Optional[Dict[str, Any]], Optional[Tuple[str, int, int]]]] = []
+        for file_path, label, metadata in dataset_files:
+            cache_key = self._hash_cache_key(file_path)
+            file_hash = self._lookup_cached_hash(cache_key)
+            unique_size = self._claim_unique_size(cache_key)
+            if file_hash is None and not self._fuse_hash_upload and not unique_size:
+                misses.append((file_path, label, metadata, cache_key))
+            else:
+                yield file_path, label, metadata, file_hash
+
+        if not misses:
+            return
+
+        # 大檔案優先送出（最長處理時間優先），避免最後由單一行程處理大檔案而其他行程閒置
+        misses.sort(key=lambda entry: entry[3][1] if entry[3] else 0, reverse=True)
+
+        hash_workers = min(self._hash_workers, len(misses))
+        batch_size = max(1, min(self.HASH_BATCH_MAX_FILES, len(misses) // (hash_workers * 4)))
+        with ProcessPoolExecutor(max_workers=hash_workers) as hash_pool:
+            hash_futures = {}
+            for start in range(0, len(misses), batch_size):
+                batch = misses[start:start + batch_size]
+                hash_future = hash_pool.submit(
+                    calculate_file_hashes, [entry[0] for entry in batch], self._hash_algorithm
+                )
+                hash_futures[hash_future] = batch
+
+            for hash_future in as_completed(hash_futures):
+                batch = hash_futures[hash_future]
+                try:
+                    results = hash_future.result()
+                except Exception as exc:
+                    # 整批失敗（例如工作行程終止）：交由 upload_single_file 逐檔重新計算
+                    self.logger.warning(f"平行計算雜湊失敗：{exc}")
+                    results = [(None, None)] * len(batch)
+
+                for (file_path, _, _, cache_key), (file_hash, error) in zip(batch, results):
+                    if file_hash is not None:
+                        self._remember_hash(cache_key, file_hash)
+                    elif error is not None:
+                        # 交由 upload_single_file 重新計算並記錄錯誤
+                        self.logger.warning(f"平行計算雜湊失敗 {file_path.name}：{error}")
+
+                # 整批雜湊值以一次 $in 查詢是否已存在，上傳執行緒不需逐檔查詢
+                self.uploader.check_existing_hashes(
+                    file_hash for file_hash, _ in results if file_hash is not None
+                )
+                for (file_path, label, metadata, _), (file_hash, _) in zip(batch, results):
+                    yield file_path, label, metadata, file_hash
+
+    def _preload_existing_hashes(
+        self,
+        dataset_files: List[Tuple[Path, str, Optional[Dict[str, Any]]]]
+    ) -> None:
+        """
+        預先載入資料庫既有雜湊值
+        只以 $in 查詢雜湊快取中、進度檔未記錄的雜湊值，不必串流整個集合；
+        快取未命中的檔案於行程池算出雜湊後，由 _iter_file_hashes 逐批以 $in 查詢
+
+        Args:
+            dataset_files: 檔案列表
+        """
+        uploaded_files = self.progress['uploaded_files']
+        candidates: set = set()
+        for file_path, _, _ in dataset_files:
+            file_hash = self._lookup_cached_hash(self._hash_cache_key(file_path))
+            if file_hash is not None and file_hash not in uploaded_files:
+                candidates.add(file_hash)
+
+        self.uploader.preload_existing_hashes(candidates)
+
+    def _load_existing_file_sizes(
+        self,
+        dataset_files: List[Tuple[Path, str, Optional[Dict[str, Any]]]]
+    ) -> None:
+        """
+        大小預先篩選：只以 $in 查詢本次檔案的大小是否已存在於資料庫，不讀取整個集合
+
+        Args:
+            dataset_files: 檔案列表
+        """
+        candidate_sizes: set = set()
+        for file_path, _, _ in dataset_files:
+            cache_key = self._hash_cache_key(file_path)
+            if cache_key is not None:
+                candidate_sizes.add(cache_key[1])
+
+        self._known_sizes = self.uploader.load_existing_file_sizes(candidate_sizes)
+        self._checked_sizes = candidate_sizes if self._known_sizes is not None else set()
+
     def batch_upload(self, dry_run: bool = False) -> None:
         """執行批次上傳"""
         self.logger.info("=" * 60)
         self.logger.info(f"開始執行 {self.dataset_name} 批次上傳")
         self.logger.info("=" * 60)
 
-        # 掃描資料夾
-        dataset_files = self.scan_directory()
+        # 掃描資料夾（預覽時已掃描過則沿用）
+        dataset_files = self.discover_files()
         if not dataset_files:
             self.logger.warning("沒有找到任何檔案。")
             return
@@ -377,27 +1207,78 @@ class BaseBatchUploader(ABC):
         # 開始上傳
         self.logger.info("正在上傳檔案……")
 
-        concurrent = self.config.UPLOAD_BEHAVIOR['concurrent_uploads']
-        if concurrent > 1:
-            with ThreadPoolExecutor(max_workers=concurrent) as executor:
-                futures = {
-                    executor.submit(self.upload_single_file, file_path, label, metadata): (file_path, label)
-                    for file_path, label, metadata in dataset_files
-                }
+        # 一次載入資料庫既有雜湊值，避免逐檔查詢
+        if self._skip_existing and self._check_duplicates:
+            if self.uploader.has_other_algorithm_records():
+                self.logger.warning(
+                    f"資料庫中有以 {self._hash_algorithm} 以外演算法計算雜湊的記錄，"
+                    f"這些檔案無法比對去重，可能被重複上傳"
+                )
+            self._preload_existing_hashes(dataset_files)
+            if self._size_prefilter:
+                self._load_existing_file_sizes(dataset_files)
 
-                with tqdm(total=len(dataset_files), desc=f"{self.dataset_name} 上傳進度") as progress_bar:
-                    for future in as_completed(futures):
-                        future.result()
+        if self._calibrate_uploads:
+            self._calibrate_concurrent_uploads()
+        concurrent = self._concurrent_uploads
+        if concurrent > 1:
+            # 雜湊計算完成的檔案隨即送入上傳執行緒池，計算與上傳重疊進行
+            # 同時排隊的上傳數以 UPLOAD_QUEUE_FACTOR × 執行緒數為上限：中斷（Ctrl+C）時執行緒池結束前
+            # 只需完成少量已排隊的檔案，而不是整個資料集
+            in_flight = threading.BoundedSemaphore(concurrent * self.UPLOAD_QUEUE_FACTOR)
+            upload_errors: List[BaseException] = []
+
+            def _on_upload_done(future: Future) -> None:
+                in_flight.release()
+                progress_bar.update(1)
+                exc = future.exception()
+                if exc is not None:
+                    upload_errors.append(exc)
+
+            with ThreadPoolExecutor(max_workers=concurrent) as executor, \
+                    tqdm(total=len(dataset_files), desc=f"{self.dataset_name} 上傳進度") as progress_bar:
+                for file_path, label, metadata, file_hash in self._iter_file_hashes(dataset_files):
+                    # 雜湊值已知的檔案先以記憶體中的結果（進度檔、預先載入與逐批 $in 查詢）比對，
+                    # 已存在者不必送入執行緒池；需查詢資料庫者留給上傳執行緒
+                    if (self._skip_existing and file_hash is not None
+                            and self._skip_if_existing(file_path, file_hash, known_only=True)):
                         progress_bar.update(1)
+                        continue
+                    in_flight.acquire()
+                    future = executor.submit(self.upload_single_file, file_path, label, metadata, file_hash)
+                    future.add_done_callback(_on_upload_done)
+
+            if upload_errors:
+                raise upload_errors[0]
         else:
-            with tqdm(dataset_files, desc=f"{self.dataset_name} 上傳進度") as progress_bar:
-                for file_path, label, metadata in progress_bar:
-                    self.upload_single_file(file_path, label, metadata)
-                    progress_bar.set_postfix({
-                        '成功': self.stats['success'],
-                        '失敗': self.stats['failed'],
-                        '跳過': self.stats['skipped'],
-                    })
+            # 單執行緒上傳時雜湊仍由行程池計算，上傳迴圈只等待已完成的批次
+            with tqdm(
+                self._iter_file_hashes(dataset_files),
+                total=len(dataset_files),
+                desc=f"{self.dataset_name} 上傳進度"
+            ) as progress_bar:
+                # 統計數字最多每 POSTFIX_INTERVAL 秒更新一次，且不強制重繪（交由 tqdm 自身的更新頻率）
+                last_postfix = 0.0
+                for file_path, label, metadata, file_hash in progress_bar:
+                    self.upload_single_file(file_path, label, metadata, file_hash)
+                    now = time.monotonic()
+                    if now - last_postfix >= self.POSTFIX_INTERVAL:
+                        last_postfix = now
+                        progress_bar.set_postfix({
+                            '成功': self.stats['success'],
+                            '失敗': self.stats['failed'],
+                            '跳過': self.stats['skipped'],
+                        }, refresh=False)
+                progress_bar.set_postfix({
+                    '成功': self.stats['success'],
+                    '失敗': self.stats['failed'],
+                    '跳過': self.stats['skipped'],
+                })
+
+        # 寫入剩餘的批次文件並回收結果
+        self.uploader.flush()
+        self._apply_insert_results()
+        self._flush_progress()
 
         self._print_summary()
         self._save_report()
@@ -454,8 +1335,7 @@ class BaseBatchUploader(ABC):
                 'config_snapshot': self.config.get_config_summary(),
             }
 
-            with report_file.open('w', encoding='utf-8') as handle:
-                json.dump(report_payload, handle, indent=2, ensure_ascii=False)
+            write_json_file(report_file, report_payload)
 
             self.logger.info(f"已儲存報告檔案：{report_file}")
 
@@ -469,3 +1349,6 @@ class BaseBatchUploader(ABC):
     def cleanup(self) -> None:
         """清理資源"""
         self.uploader.close()
+        self._apply_insert_results()
+        self._flush_progress()
+        atexit.unregister(self._flush_progress)
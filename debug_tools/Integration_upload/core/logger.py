@@ -5,15 +5,65 @@
 
 from __future__ import annotations
 
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 from typing import Dict, Any
 
 
+class _InProcessQueueHandler(QueueHandler):
+    """
+    同一行程內的佇列處理器
+    記錄由同一行程的 QueueListener 取出，不需序列化或複製；時間與格式字串的套用、例外堆疊的格式化留給背景執行緒
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        在呼叫端合併 % 參數（參數可能是之後會被修改的可變物件），其餘格式化留給背景執行緒
+        exc_info 仍附在記錄上，由背景執行緒格式化例外堆疊
+
+        Args:
+            record: 日誌記錄
+
+        Returns:
+            已合併訊息的原始日誌記錄
+        """
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
 class BatchUploadLogger:
     """負責建立共用記錄器"""
 
+    # 格式字串用到以下欄位時才需要由呼叫堆疊找出來源位置
+    CALLER_FIELDS = ('%(pathname)', '%(filename)', '%(module)', '%(funcName)', '%(lineno)')
+    # 格式字串用到以下欄位時才需要在建立記錄時取得執行緒與行程資訊
+    THREAD_FIELDS = ('%(thread)', '%(threadName)')
+
+    @staticmethod
+    def _skip_unused_record_fields(log_format: str) -> None:
+        """
+        依格式字串停止收集未使用的記錄欄位（減少每筆記錄的建立成本）
+        這些是 logging 模組的全域設定，會影響同一行程中所有記錄器（包含第三方套件）建立的記錄；
+        只在 setup_logger 中、格式字串確實未使用對應欄位時才關閉
+
+        Args:
+            log_format: 日誌格式字串
+        """
+        if not any(field in log_format for field in BatchUploadLogger.THREAD_FIELDS):
+            logging.logThreads = False
+        if '%(process)' not in log_format:
+            logging.logProcesses = False
+        if '%(processName)' not in log_format:
+            logging.logMultiprocessing = False
+        if not any(field in log_format for field in BatchUploadLogger.CALLER_FIELDS):
+            # 略過 Logger.findCaller 的堆疊走訪（每筆記錄中成本最高的部分）
+            logging._srcfile = None
+
     @staticmethod
     def setup_logger(
         name: str,
@@ -21,6 +71,7 @@ class BatchUploadLogger:
     ) -> logging.Logger:
         """
         設置日誌記錄器
+        檔案處理器經由 QueueHandler / QueueListener 在背景執行緒寫入；控制台處理器維持同步輸出，與互動提示的順序一致
 
         Args:
             name: 記錄器名稱
@@ -41,7 +92,9 @@ class BatchUploadLogger:
         if logger.handlers:
             return logger
 
-        formatter = logging.Formatter(logging_config['format'])
+        log_format = logging_config['format']
+        formatter = logging.Formatter(log_format)
+        BatchUploadLogger._skip_unused_record_fields(log_format)
 
         # 檔案處理器
         log_path = Path(logging_config['log_file'])
@@ -56,12 +109,21 @@ class BatchUploadLogger:
         file_handler.setLevel(logging.DEBUG)
         file_handler.setFormatter(formatter)
 
+        # 檔案寫入（含輪替）交由背景執行緒處理，上傳執行緒只需把記錄放入佇列
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        queue_handler = _InProcessQueueHandler(log_queue)
+        queue_handler.setLevel(logging.DEBUG)
+        listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+        listener.start()
+        # 程式結束前寫完佇列中剩餘的記錄
+        atexit.register(listener.stop)
+
         # 控制台處理器
         console_handler = logging.StreamHandler()
         console_handler.setLevel(logging.INFO)
         console_handler.setFormatter(formatter)
 
-        logger.addHandler(file_handler)
+        logger.addHandler(queue_handler)
         logger.addHandler(console_handler)
 
         return logger
@@ -5,27 +5,108 @@ MongoDB 和 GridFS 操作模組
 
 from __future__ import annotations
 
+import atexit
 import logging
+import os
+import threading
+import time
 import uuid
+from contextlib import nullcontext
 from datetime import datetime, UTC
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 from bson.objectid import ObjectId
 from gridfs import GridFS
 from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+from pymongo.write_concern import WriteConcern
 
-from .utils import build_analysis_container
+from .utils import (
+    DEFAULT_HASH_ALGORITHM,
+    build_analysis_container,
+    calculate_file_hash,
+    dumps_json_line,
+    new_file_hasher,
+    open_sequential,
+    write_checksum_sidecar,
+)
+
+try:
+    import zstandard
+    ZSTANDARD_AVAILABLE = True
+except ImportError:
+    ZSTANDARD_AVAILABLE = False
+
+
+def _read_chunk(handle: Any, size: int) -> bytes:
+    """
+    自無緩衝檔案物件讀取剛好 size 位元組（檔案結尾時可較少）
+    無緩衝的 read 可能只回傳部分內容，GridFS 區塊除最後一個外都必須是完整大小
+
+    Args:
+        handle: 檔案物件
+        size: 要讀取的位元組數
+
+    Returns:
+        讀取的內容
+    """
+    data = handle.read(size)
+    while data and len(data) < size:
+        more = handle.read(size - len(data))
+        if not more:
+            break
+        data += more
+    return data
 
 
 class MongoDBUploader:
     """封裝 MongoDB 與 GridFS 操作的類別"""
 
+    # 每累積多少筆文件才以 insert_many 寫入一次
+    INSERT_BATCH_SIZE = 256
+
+    # 最早排入的文件等待超過此秒數時，未滿一批也先寫入（由每批第一筆文件排入時啟動的計時器觸發，不需等下一筆文件）
+    # （大檔案上傳較慢時，文件與進度記錄不會長時間停留在記憶體中；中斷時 GridFS 內容也不會缺少對應文件）
+    INSERT_FLUSH_INTERVAL = 5.0
+
+    # 壓縮後需小於原大小的此比例才採用壓縮結果
+    COMPRESSION_MIN_RATIO = 0.95
+
+    # 預先載入既有雜湊值時，每次 $in 查詢（或游標批次）的筆數
+    HASH_QUERY_BATCH_SIZE = 10000
+
+    # 檢查既有記錄雜湊演算法的查詢時間上限（毫秒）
+    HASH_ALGORITHM_CHECK_MS = 2000
+
+    # 未指定時的 GridFS 區塊大小（pymongo 預設 255 KiB）；較大區塊可減少區塊文件數與讀取端的查詢次數
+    GRIDFS_CHUNK_SIZE = 1024 * 1024
+
+    # 雜湊值查詢的投影：只含 file_hash 索引中的欄位，查詢可完全由索引回答
+    _HASH_ONLY_PROJECTION = {'_id': 0, 'info_features.file_hash': 1}
+    # 檔案大小查詢的投影：只含 file_size 索引中的欄位
+    _SIZE_ONLY_PROJECTION = {'_id': 0, 'info_features.file_size': 1}
+
+    # 寫入 GridFS 時每次 insert_many 的區塊資料量上限（亦為每個上傳執行緒暫存的資料量上限，遠低於 16 MB 訊息上限）
+    GRIDFS_WRITE_BATCH_BYTES = 8 * 1024 * 1024
+
+    # 同一程序共用的 MongoClient：(連線字串, 並行數) -> MongoClient
+    # 預覽、刪除與各資料集上傳依序建立上傳器時沿用已完成握手與驗證的連線池，程式結束時才關閉
+    _shared_clients: Dict[Tuple[str, int], MongoClient] = {}
+    _shared_clients_lock = threading.Lock()
+
     def __init__(
         self,
         mongodb_config: Dict[str, Any],
         use_gridfs: bool,
-        logger: logging.Logger
+        logger: logging.Logger,
+        concurrency: int = 1,
+        compression: Optional[str] = None,
+        hash_algorithm: str = DEFAULT_HASH_ALGORITHM,
+        unique_file_hash: bool = False,
+        chunk_size: Optional[int] = None,
+        file_size_index: bool = False,
+        on_timed_flush: Optional[Callable[[], None]] = None
     ) -> None:
         """
         初始化 MongoDB 上傳器
@@ -34,59 +115,364 @@ class MongoDBUploader:
             mongodb_config: MongoDB 配置字典，包含 host, port, username, password, database, collection
             use_gridfs: 是否使用 GridFS 儲存檔案
             logger: 日誌記錄器
+            concurrency: 同時使用此連線的執行緒數（用於設定連線池大小）
+            compression: GridFS 內容壓縮方式（None 或 'zstd'）
+            hash_algorithm: 上傳時一併計算雜湊值所用的演算法
+            unique_file_hash: 是否建立 file_hash 唯一索引，由伺服器拒絕重複檔案
+            chunk_size: GridFS 區塊大小（位元組，None 時使用 GRIDFS_CHUNK_SIZE）
+            file_size_index: 是否建立 info_features.file_size 索引（供大小預先篩選查詢）
+            on_timed_flush: 計時器寫入逾時批次後呼叫（供批次上傳器回收寫入結果）
         """
         self.config = mongodb_config
+        self.hash_algorithm = hash_algorithm
+        self.unique_file_hash = unique_file_hash
+        self.file_size_index = file_size_index
+        self.chunk_size = chunk_size or self.GRIDFS_CHUNK_SIZE
         self.use_gridfs = use_gridfs
         self.logger = logger
+        self.concurrency = max(concurrency, 1)
+        self.compression = compression
+        if compression == 'zstd' and not ZSTANDARD_AVAILABLE:
+            self.logger.warning("未安裝 zstandard 套件，GridFS 將不壓縮上傳")
+            self.compression = None
+        elif compression not in (None, 'zstd'):
+            self.logger.warning("不支援的 GridFS 壓縮方式：%s，將不壓縮上傳", compression)
+            self.compression = None
         self.mongo_client: Optional[MongoClient] = None
         self.db = None
         self.collection = None
         self.fs: Optional[GridFS] = None
+        self._thread_local = threading.local()
+
+        # 待寫入文件與寫入結果（供批次上傳器回收）
+        self._pending_lock = threading.Lock()
+        self._pending_docs: List[Dict[str, Any]] = []
+        self._pending_hashes: set = set()
+        # 目前這批第一筆文件排入的時間（time.monotonic）
+        self._pending_since = 0.0
+        # 目前這批的逾時寫入計時器（批次已寫入時為 None）
+        self._flush_timer: Optional[threading.Timer] = None
+        self._on_timed_flush = on_timed_flush
+        self._inserted_docs: List[Dict[str, Any]] = []
+        self._failed_docs: List[Dict[str, Any]] = []
+        # 因 file_hash 唯一索引被伺服器拒絕（資料庫已有相同檔案）的文件
+        self._duplicate_docs: List[Dict[str, Any]] = []
+
+        # 預先載入的既有雜湊值；None 表示未載入，改為逐筆查詢資料庫
+        self._known_hashes: Optional[set] = None
+        # 以 $in 預先查詢過的候選雜湊值；None 表示 _known_hashes 涵蓋整個集合
+        self._checked_hashes: Optional[set] = None
+
         self._connect()
 
     def _connect(self) -> None:
-        """建立 MongoDB 連接"""
+        """建立 MongoDB 連接（相同連線設定與並行數時沿用共用的 MongoClient）"""
+        reused = False
         try:
             connection_string = (
                 f"mongodb://{self.config['username']}:{self.config['password']}"
                 f"@{self.config['host']}:{self.config['port']}/admin"
             )
-            self.mongo_client = MongoClient(connection_string)
+            client_key = (connection_string, self.concurrency)
+            with MongoDBUploader._shared_clients_lock:
+                shared_client = MongoDBUploader._shared_clients.get(client_key)
+                if shared_client is None:
+                    shared_client = MongoClient(
+                        connection_string,
+                        # 伺服器未啟用或本機缺少壓縮套件時，pymongo 會略過該壓縮演算法
+                        compressors='zstd,snappy,zlib',
+                        maxPoolSize=max(self.concurrency * 4, 16),
+                        # 上傳執行緒數量的連線常駐於連線池，閒置期間（例如等待雜湊）被關閉後不需重新握手
+                        minPoolSize=self.concurrency,
+                        retryWrites=True,
+                        uuidRepresentation='standard',
+                    )
+                    MongoDBUploader._shared_clients[client_key] = shared_client
+                    reused = False
+                else:
+                    reused = True
+            self.mongo_client = shared_client
             self.db = self.mongo_client[self.config['database']]
             self.collection = self.db[self.config['collection']]
+            # 批次寫入與 GridFS 區塊寫入只需主節點確認，不等待 journal
+            bulk_write_concern = WriteConcern(w=1, j=False)
+            self._bulk_collection = self.collection.with_options(write_concern=bulk_write_concern)
+            self._bulk_db = self.db.with_options(write_concern=bulk_write_concern)
+            # 每個檔案都會呼叫的方法先綁定，減少屬性查找
+            self._find_one = self.collection.find_one
+            self._insert_many = self._bulk_collection.insert_many
 
             if self.use_gridfs:
-                self.fs = GridFS(self.db)
+                self.fs = GridFS(self._bulk_db)
+                # 上傳時直接寫入的 GridFS 集合（預設 bucket 'fs'）
+                self._gridfs_files = self._bulk_db['fs.files']
+                self._gridfs_chunks = self._bulk_db['fs.chunks']
 
-            self.mongo_client.admin.command("ping")
-            self.logger.info("成功連線至 MongoDB。")
+            if reused:
+                self.logger.debug("沿用既有的 MongoDB 連線池。")
+            else:
+                self.mongo_client.admin.command("ping")
+                self.logger.info("成功連線至 MongoDB。")
         except Exception as exc:
             self.logger.error("無法連線至 MongoDB：%s", exc)
+            if self.mongo_client is not None and not reused:
+                # 連線失敗的用戶端不留在共用表中，下次重新建立
+                with MongoDBUploader._shared_clients_lock:
+                    MongoDBUploader._shared_clients.pop(client_key, None)
+                self.mongo_client.close()
+                self.mongo_client = None
             raise
 
-    def file_exists(self, file_hash: str, check_duplicates: bool = True) -> bool:
+        self._ensure_indexes()
+        if not reused:
+            self._warm_pool()
+
+    def _warm_pool(self) -> None:
+        """以與並行數相同的執行緒同時 ping，預先建立連線池中的連線"""
+        if self.concurrency <= 1:
+            return
+
+        def _ping() -> None:
+            try:
+                self.mongo_client.admin.command("ping")
+            except Exception as exc:
+                self.logger.debug("預熱連線失敗：%s", exc)
+
+        threads = [threading.Thread(target=_ping) for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def make_gridfs(self) -> GridFS:
+        """
+        取得目前執行緒專用的 GridFS 物件（共用同一個 MongoClient）
+
+        Returns:
+            GridFS 物件
+        """
+        fs = getattr(self._thread_local, 'fs', None)
+        if fs is None:
+            fs = GridFS(self._bulk_db)
+            self._thread_local.fs = fs
+        return fs
+
+    def _ensure_indexes(self) -> None:
+        """建立重複檢查與主鍵查詢所需的索引（索引已存在時不會重建）"""
+        if self.unique_file_hash:
+            # 只約束字串型別的 file_hash，避免缺少雜湊值的舊文件違反唯一性
+            file_hash_index = ([('info_features.file_hash', 1)], {
+                'name': 'file_hash_unique_idx',
+                'unique': True,
+                'partialFilterExpression': {'info_features.file_hash': {'$type': 'string'}},
+            })
+        else:
+            file_hash_index = ([('info_features.file_hash', 1)], {'name': 'file_hash_idx'})
+        index_specs = [
+            (self.collection, file_hash_index),
+            (self.collection, ([('AnalyzeUUID', 1)], {'name': 'analyze_uuid_idx', 'unique': True})),
+        ]
+        if self.file_size_index:
+            index_specs.append((self.collection, ([('info_features.file_size', 1)], {'name': 'file_size_idx'})))
+        if self.use_gridfs:
+            # 與 GridIn 自動建立的 GridFS 索引相同（名稱沿用預設），讀取與區塊唯一性都依賴這些索引
+            index_specs += [
+                (self.db['fs.chunks'], ([('files_id', 1), ('n', 1)], {'name': 'files_id_1_n_1', 'unique': True})),
+                (self.db['fs.files'], ([('filename', 1), ('uploadDate', 1)], {'name': 'filename_1_uploadDate_1'})),
+            ]
+        for collection, (keys, options) in index_specs:
+            try:
+                collection.create_index(keys, background=True, **options)
+            except Exception as exc:
+                # 權限不足或既有資料重複時僅警告，不影響上傳
+                self.logger.warning("無法建立索引 %s：%s", options['name'], exc)
+
+    def file_exists(self, file_hash: str, check_duplicates: bool = True, known_only: bool = False) -> bool:
         """
         檢查檔案是否已存在
 
         Args:
             file_hash: 檔案雜湊值
             check_duplicates: 是否檢查重複
+            known_only: 只依記憶體中的結果判斷，需查詢資料庫時直接回傳 False
 
         Returns:
             檔案是否存在
         """
         if not check_duplicates:
             return False
-        existing = self.collection.find_one({'info_features.file_hash': file_hash})
+        # 已排入批次但尚未寫入的文件也視為存在
+        if file_hash in self._pending_hashes:
+            return True
+        if self._known_hashes is not None:
+            if file_hash in self._known_hashes:
+                return True
+            if self._checked_hashes is None or file_hash in self._checked_hashes:
+                return False
+        if known_only:
+            return False
+        # 只投影索引欄位（不含 _id），由 file_hash 索引直接回答（covered query），不需讀取文件本身
+        existing = self._find_one({'info_features.file_hash': file_hash}, self._HASH_ONLY_PROJECTION)
         return existing is not None
 
+    def has_other_algorithm_records(self) -> bool:
+        """
+        檢查集合中是否有以其他雜湊演算法記錄 file_hash 的文件（未帶 file_hash_algorithm 者視為 SHA-256）
+        不同演算法的雜湊值無法互相比對，這些檔案即使內容相同也不會被判定為重複
+
+        使用預設演算法時只需找出帶有 file_hash_algorithm 的文件（只有非預設演算法的記錄會寫入此欄位），
+        例如先前以 xxh3_128 上傳後改回 SHA-256 的情況；file_hash_algorithm 沒有索引，以 HASH_ALGORITHM_CHECK_MS 限制查詢時間
+
+        Returns:
+            是否存在其他演算法的記錄（查詢失敗或逾時時為 False）
+        """
+        if self.hash_algorithm == DEFAULT_HASH_ALGORITHM:
+            query = {'info_features.file_hash_algorithm': {'$exists': True}}
+        else:
+            query = {'info_features.file_hash_algorithm': {'$ne': self.hash_algorithm}}
+        try:
+            return self._find_one(query, {'_id': 1}, max_time_ms=self.HASH_ALGORITHM_CHECK_MS) is not None
+        except Exception as exc:
+            self.logger.debug("無法檢查既有記錄的雜湊演算法：%s", exc)
+            return False
+
+    def load_existing_file_sizes(self, candidate_sizes: Iterable[int]) -> Optional[set]:
+        """
+        以 $in 分批查詢候選檔案大小中實際存在於集合的值（走 file_size_idx 索引，只取回索引欄位）
+
+        Args:
+            candidate_sizes: 候選檔案大小（位元組）
+
+        Returns:
+            存在於集合中的檔案大小集合，查詢失敗時為 None
+        """
+        candidates = list(set(candidate_sizes))
+        projection = self._SIZE_ONLY_PROJECTION
+        sizes: set = set()
+        try:
+            for start in range(0, len(candidates), self.HASH_QUERY_BATCH_SIZE):
+                chunk = candidates[start:start + self.HASH_QUERY_BATCH_SIZE]
+                cursor = self.collection.find({'info_features.file_size': {'$in': chunk}}, projection)
+                sizes.update(document['info_features']['file_size'] for document in cursor)
+        except Exception as exc:
+            self.logger.warning("無法查詢既有檔案大小，停用大小預先篩選：%s", exc)
+            return None
+        self.logger.info("%d 種候選檔案大小中有 %d 種已存在於資料庫。", len(candidates), len(sizes))
+        return sizes
+
+    def preload_existing_hashes(self, candidate_hashes: Optional[Iterable[str]] = None) -> None:
+        """
+        預先載入資料庫中既有的 file_hash，之後 file_exists 只需查詢記憶體中的集合
+
+        提供候選雜湊值時以 $in 分批查詢（走 file_hash_idx 索引），只取回實際存在者；
+        未提供時以投影游標串流讀取整個集合的 file_hash（不受 distinct 16 MB 結果上限限制）
+
+        Args:
+            candidate_hashes: 候選雜湊值（可選）
+        """
+        projection = self._HASH_ONLY_PROJECTION
+        known: set = set()
+        checked: Optional[set] = None
+        try:
+            if candidate_hashes is None:
+                cursor = self.collection.find({}, projection, batch_size=self.HASH_QUERY_BATCH_SIZE)
+                known.update(document.get('info_features', {}).get('file_hash') for document in cursor)
+                known.discard(None)
+            else:
+                checked = set(candidate_hashes)
+                known = self._query_existing_hashes(list(checked))
+        except Exception as exc:
+            self.logger.warning("無法預先載入既有雜湊值，改為逐筆查詢：%s", exc)
+            return
+
+        with self._pending_lock:
+            self._known_hashes = known
+            self._checked_hashes = checked
+        self.logger.info("已載入 %d 筆既有檔案雜湊值。", len(known))
+
+    def check_existing_hashes(self, candidate_hashes: Iterable[str]) -> None:
+        """
+        以 $in 批次查詢新計算出的雜湊值，併入預先載入的結果
+        只在以候選雜湊值預先載入後有作用；之後 file_exists 對這些雜湊值不需逐筆查詢
+
+        Args:
+            candidate_hashes: 候選雜湊值
+        """
+        checked = self._checked_hashes
+        if self._known_hashes is None or checked is None:
+            return
+        candidates = [file_hash for file_hash in set(candidate_hashes) if file_hash not in checked]
+        if not candidates:
+            return
+        try:
+            known = self._query_existing_hashes(candidates)
+        except Exception as exc:
+            # 查詢失敗時不記錄為已檢查，file_exists 會改為逐筆查詢
+            self.logger.debug("無法批次查詢既有雜湊值：%s", exc)
+            return
+
+        with self._pending_lock:
+            self._known_hashes.update(known)
+            checked.update(candidates)
+
+    def _query_existing_hashes(self, candidates: List[str]) -> set:
+        """
+        以 $in 分批查詢實際存在於集合中的雜湊值（走 file_hash_idx 索引）
+
+        Args:
+            candidates: 候選雜湊值列表
+
+        Returns:
+            存在於集合中的雜湊值集合
+        """
+        projection = self._HASH_ONLY_PROJECTION
+        known: set = set()
+        for start in range(0, len(candidates), self.HASH_QUERY_BATCH_SIZE):
+            chunk = candidates[start:start + self.HASH_QUERY_BATCH_SIZE]
+            cursor = self.collection.find({'info_features.file_hash': {'$in': chunk}}, projection)
+            known.update(document['info_features']['file_hash'] for document in cursor)
+        return known
+
+    def measure_upload_bandwidth(self, sample_size: int = 4 * 1024 * 1024) -> Optional[float]:
+        """
+        以一次 GridFS 寫入量測實際上傳頻寬（寫入後立即刪除）
+        使用隨機內容，避免連線壓縮使量測結果偏高
+
+        Args:
+            sample_size: 測試資料大小（位元組）
+
+        Returns:
+            上傳速率（MB/s），未使用 GridFS 或量測失敗時為 None
+        """
+        if not self.fs:
+            return None
+        sample = os.urandom(sample_size)
+        file_id = None
+        try:
+            started = time.perf_counter()
+            # 與實際上傳相同的寫入路徑（提供雜湊值以略過雜湊計算）
+            file_id, _ = self._write_gridfs(Path('__bandwidth_probe__'), {}, sample, '')
+            elapsed = time.perf_counter() - started
+        except Exception as exc:
+            self.logger.warning("無法量測上傳頻寬：%s", exc)
+            return None
+        finally:
+            if file_id is not None:
+                try:
+                    self.fs.delete(file_id)
+                except Exception as exc:
+                    self.logger.warning("無法刪除頻寬量測檔案 %s：%s", file_id, exc)
+        return sample_size / (1024 * 1024) / max(elapsed, 1e-6)
+
     def upload_file(
         self,
         file_path: Path,
         label: str,
-        file_hash: str,
+        file_hash: Optional[str],
         info_features: Dict[str, Any],
-        gridfs_metadata: Optional[Dict[str, Any]] = None
+        gridfs_metadata: Optional[Dict[str, Any]] = None,
+        file_data: Optional[bytes] = None,
+        on_queued: Optional[Callable[[str], None]] = None
     ) -> Optional[str]:
         """
         上傳檔案到 MongoDB/GridFS
@@ -94,9 +480,11 @@ class MongoDBUploader:
         Args:
             file_path: 檔案路徑
             label: 標籤
-            file_hash: 檔案雜湊值
+            file_hash: 檔案雜湊值（None 時於寫入 GridFS 的同時計算，並回填至 info_features['file_hash']）
             info_features: 資訊特徵字典
             gridfs_metadata: GridFS 元數據（可選）
+            file_data: 已讀入的檔案內容（可選，未提供時從磁碟串流讀取）
+            on_queued: 文件排入批次寫入前以 AnalyzeUUID 呼叫（可選；之後任何執行緒都可能寫入並回收這筆文件）
 
         Returns:
             AnalyzeUUID，如果失敗則為 None
@@ -104,43 +492,289 @@ class MongoDBUploader:
         analyze_uuid = str(uuid.uuid4())
 
         try:
-            with open(file_path, 'rb') as handle:
-                file_data = handle.read()
-
             file_id = None
             if self.fs:
                 metadata = gridfs_metadata or {
                     'file_hash': file_hash,
                     'label': label,
                 }
-                file_id = self.fs.put(
-                    file_data,
-                    filename=file_path.name,
-                    metadata=metadata,
-                )
+                file_id, file_hash = self._write_gridfs(file_path, metadata, file_data, file_hash)
                 self.logger.debug("檔案已寫入 GridFS：%s", file_id)
+            elif file_hash is None:
+                file_hash = calculate_file_hash(file_path, self.hash_algorithm)
+            info_features['file_hash'] = file_hash
 
             document = self._create_document(
                 analyze_uuid=analyze_uuid,
                 filename=file_path.name,
                 file_id=file_id,
                 info_features=info_features,
+                file_type=file_path.suffix.lstrip('.').lower(),
             )
 
-            self.collection.insert_one(document)
-            self.logger.debug("已新增 MongoDB 文件：%s", analyze_uuid)
+            if on_queued is not None:
+                on_queued(analyze_uuid)
+            self._queue_document(document)
+            self.logger.debug("已排入 MongoDB 批次寫入：%s", analyze_uuid)
             return analyze_uuid
 
         except Exception as exc:
             self.logger.error("上傳檔案 %s 時發生錯誤：%s", file_path.name, exc)
             return None
 
+    def _write_gridfs(
+        self,
+        file_path: Path,
+        metadata: Dict[str, Any],
+        file_data: Optional[bytes] = None,
+        file_hash: Optional[str] = None
+    ) -> Tuple[ObjectId, str]:
+        """
+        寫入 GridFS（直接寫入 fs.chunks / fs.files，格式與 GridIn 相同，GridFS 讀取端不受影響）
+        區塊文件累積至 GRIDFS_WRITE_BATCH_BYTES 才以一次 insert_many 寫入，取代 GridIn 每個區塊一次往返；
+        也省去 GridIn 每個檔案檢查索引的兩次查詢（索引於連線時由 _ensure_indexes 建立）
+        未提供內容時從磁碟逐區塊讀取，記憶體用量以一批區塊為上限
+        未提供雜湊值時在同一次讀取中計算，寫入 fs.files 的 metadata['file_hash']
+
+        Args:
+            file_path: 檔案路徑
+            metadata: GridFS 元數據
+            file_data: 已讀入的檔案內容（可選，未提供時從磁碟串流讀取）
+            file_hash: 檔案雜湊值（可選）
+
+        Returns:
+            (GridFS 檔案 ID, 檔案雜湊值) tuple
+        """
+        if self.compression:
+            if file_data is None:
+                file_data = file_path.read_bytes()
+            if file_hash is None:
+                hasher = new_file_hasher(self.hash_algorithm)
+                hasher.update(file_data)
+                file_hash = hasher.hexdigest()
+            compressed = zstandard.ZstdCompressor(level=3).compress(file_data)
+            # 已壓縮過的內容效益有限，維持原始資料
+            if len(compressed) < self.COMPRESSION_MIN_RATIO * len(file_data):
+                metadata = {**metadata, 'compression': 'zstd', 'orig_size': len(file_data)}
+                file_data = compressed
+
+        chunk_size = self.chunk_size
+        file_id = ObjectId()
+        hasher = new_file_hasher(self.hash_algorithm) if file_hash is None else None
+        length = 0
+        try:
+            # 無緩衝開啟並提示循序讀取：每個區塊直接由系統呼叫填入，核心預讀下一段內容與網路傳送重疊
+            with (nullcontext() if file_data is not None else open_sequential(file_path)) as handle:
+                batch: List[Dict[str, Any]] = []
+                batch_bytes = 0
+                chunk_index = 0
+                while True:
+                    if file_data is not None:
+                        data = file_data[length:length + chunk_size]
+                    else:
+                        data = _read_chunk(handle, chunk_size)
+                    if data:
+                        if hasher is not None:
+                            hasher.update(data)
+                        batch.append({'files_id': file_id, 'n': chunk_index, 'data': data})
+                        chunk_index += 1
+                        length += len(data)
+                        batch_bytes += len(data)
+                    # 除最後一個區塊外，每個區塊都必須剛好是 chunk_size
+                    last_chunk = len(data) < chunk_size
+                    if batch and (last_chunk or batch_bytes >= self.GRIDFS_WRITE_BATCH_BYTES):
+                        self._gridfs_chunks.insert_many(batch)
+                        batch = []
+                        batch_bytes = 0
+                    if last_chunk:
+                        break
+
+            if hasher is not None:
+                file_hash = hasher.hexdigest()
+            metadata['file_hash'] = file_hash
+            self._gridfs_files.insert_one({
+                '_id': file_id,
+                'length': length,
+                'chunkSize': chunk_size,
+                'uploadDate': datetime.now(UTC),
+                'filename': file_path.name,
+                'metadata': metadata,
+            })
+        except Exception:
+            # 清除已寫入的部分區塊
+            try:
+                self._gridfs_chunks.delete_many({'files_id': file_id})
+            except Exception as exc:
+                self.logger.warning("無法清除未完成的 GridFS 區塊 %s：%s", file_id, exc)
+            raise
+
+        return file_id, file_hash
+
+    def _queue_document(self, document: Dict[str, Any]) -> None:
+        """
+        將文件排入待寫入佇列，累積達 INSERT_BATCH_SIZE 筆或最早一筆已等待 INSERT_FLUSH_INTERVAL 秒時寫入
+
+        Args:
+            document: MongoDB 文檔
+        """
+        now = time.monotonic()
+        with self._pending_lock:
+            if not self._pending_docs:
+                self._pending_since = now
+                self._start_flush_timer()
+            self._pending_docs.append(document)
+            self._pending_hashes.add(document['info_features'].get('file_hash'))
+            if (len(self._pending_docs) < self.INSERT_BATCH_SIZE
+                    and now - self._pending_since < self.INSERT_FLUSH_INTERVAL):
+                return
+            batch = self._take_pending_batch()
+
+        self._insert_batch(batch)
+
+    def _start_flush_timer(self) -> None:
+        """啟動本批的逾時寫入計時器（呼叫端須持有 _pending_lock）"""
+        timer = threading.Timer(self.INSERT_FLUSH_INTERVAL, self._flush_stale_batch)
+        timer.daemon = True
+        self._flush_timer = timer
+        timer.start()
+
+    def _take_pending_batch(self) -> List[Dict[str, Any]]:
+        """
+        取出待寫入的文件並取消本批的計時器（呼叫端須持有 _pending_lock）
+
+        Returns:
+            待寫入文件列表
+        """
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        batch = self._pending_docs
+        self._pending_docs = []
+        return batch
+
+    def _flush_stale_batch(self) -> None:
+        """
+        計時器到期：本批第一筆文件已等待 INSERT_FLUSH_INTERVAL 秒仍未寫入時，未滿一批也先寫入
+        上傳較慢、遲遲沒有下一筆文件排入時，已上傳的內容不會一直缺少對應文件
+        """
+        with self._pending_lock:
+            # 計時器觸發後、取得鎖之前本批已被寫入（並可能開始新的一批）時不處理
+            if self._flush_timer is not threading.current_thread():
+                return
+            batch = self._take_pending_batch()
+
+        if not batch:
+            return
+        self._insert_batch(batch)
+        if self._on_timed_flush is not None:
+            try:
+                self._on_timed_flush()
+            except Exception as exc:
+                self.logger.warning("回收逾時批次的寫入結果時發生錯誤：%s", exc)
+
+    def _insert_batch(self, batch: List[Dict[str, Any]]) -> None:
+        """
+        以 insert_many(ordered=False) 寫入一批文件，並記錄各文件的寫入結果
+        created_at / updated_at 在此以寫入當下的時間填入
+
+        Args:
+            batch: 文件列表
+        """
+        failed_indexes: set = set()
+        duplicate_indexes: set = set()
+        # 同一批文件同時寫入，共用一個時間戳記
+        current_time = datetime.now(UTC)
+        for document in batch:
+            document['created_at'] = current_time
+            document['updated_at'] = current_time
+        try:
+            self._insert_many(batch, ordered=False)
+        except BulkWriteError as exc:
+            for error in exc.details.get('writeErrors', []):
+                if self._is_duplicate_file_hash(error):
+                    duplicate_indexes.add(error['index'])
+                    continue
+                failed_indexes.add(error['index'])
+                self.logger.error(
+                    "寫入 MongoDB 文件 %s 時發生錯誤：%s",
+                    batch[error['index']].get('AnalyzeUUID'), error.get('errmsg')
+                )
+        except Exception as exc:
+            failed_indexes = set(range(len(batch)))
+            self.logger.error("批次寫入 %d 筆 MongoDB 文件時發生錯誤：%s", len(batch), exc)
+
+        # 重複檔案的文件不會寫入，已寫入 GridFS 的內容需一併移除
+        for idx in duplicate_indexes:
+            self._delete_gridfs_file(batch[idx])
+
+        with self._pending_lock:
+            for idx, document in enumerate(batch):
+                if idx in failed_indexes:
+                    self._failed_docs.append(document)
+                elif idx in duplicate_indexes:
+                    self._duplicate_docs.append(document)
+                    if self._known_hashes is not None:
+                        self._known_hashes.add(document['info_features'].get('file_hash'))
+                else:
+                    self._inserted_docs.append(document)
+                    if self._known_hashes is not None:
+                        self._known_hashes.add(document['info_features'].get('file_hash'))
+                self._pending_hashes.discard(document['info_features'].get('file_hash'))
+
+        self.logger.debug(
+            "已批次新增 %d 筆 MongoDB 文件", len(batch) - len(failed_indexes) - len(duplicate_indexes)
+        )
+
+    @staticmethod
+    def _is_duplicate_file_hash(error: Dict[str, Any]) -> bool:
+        """判斷 BulkWriteError 中的單筆錯誤是否為 file_hash 唯一索引衝突"""
+        if error.get('code') != 11000:
+            return False
+        key_pattern = error.get('keyPattern')
+        if key_pattern is not None:
+            return 'info_features.file_hash' in key_pattern
+        return 'file_hash_unique_idx' in (error.get('errmsg') or '')
+
+    def _delete_gridfs_file(self, document: Dict[str, Any]) -> None:
+        """刪除文件對應的 GridFS 檔案（失敗時僅警告）"""
+        file_id = document.get('files', {}).get('raw', {}).get('fileId')
+        if not self.fs or file_id is None:
+            return
+        try:
+            self.make_gridfs().delete(file_id)
+        except Exception as exc:
+            self.logger.warning("無法刪除重複檔案的 GridFS 內容 %s：%s", file_id, exc)
+
+    def flush(self) -> None:
+        """寫入所有尚未寫入的文件"""
+        with self._pending_lock:
+            batch = self._take_pending_batch()
+
+        if batch:
+            self._insert_batch(batch)
+
+    def drain_insert_results(
+        self
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        取出自上次呼叫以來的批次寫入結果
+
+        Returns:
+            (已寫入文件列表, 寫入失敗文件列表, 因資料庫已有相同檔案而未寫入的文件列表) tuple
+        """
+        with self._pending_lock:
+            inserted, self._inserted_docs = self._inserted_docs, []
+            failed, self._failed_docs = self._failed_docs, []
+            duplicates, self._duplicate_docs = self._duplicate_docs, []
+        return inserted, failed, duplicates
+
     def _create_document(
         self,
         analyze_uuid: str,
         filename: str,
         file_id: Optional[ObjectId],
         info_features: Dict[str, Any],
+        file_type: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         建立 MongoDB 文檔
@@ -150,18 +784,20 @@ class MongoDBUploader:
             filename: 檔案名稱
             file_id: GridFS 檔案 ID
             info_features: 資訊特徵字典
+            file_type: 副檔名（小寫、不含點；未提供時由檔名推算）
 
         Returns:
             MongoDB 文檔
         """
-        current_time = datetime.now(UTC)
-        file_type = Path(filename).suffix.lstrip('.').lower()
+        if file_type is None:
+            file_type = Path(filename).suffix.lstrip('.').lower()
 
         document = {
             "AnalyzeUUID": analyze_uuid,
             # "current_step": 0,
-            "created_at": current_time,
-            "updated_at": current_time,
+            # 寫入時間於 _insert_batch 以整批共用的時間戳記填入
+            "created_at": None,
+            "updated_at": None,
             "files": {
                 "raw": {
                     "fileId": file_id,
@@ -246,41 +882,45 @@ class MongoDBUploader:
 
     def backup_all_records(self, backup_file: Path) -> bool:
         """
-        備份所有記錄至 JSON 檔案
+        備份所有記錄至 NDJSON（JSON Lines）檔案
+        以 cursor 串流逐筆寫出，每行一筆文件，記憶體用量與記錄數無關
 
         Args:
-            backup_file: 備份檔案路徑
+            backup_file: 備份檔案路徑（建議副檔名 .ndjson）
 
         Returns:
             備份是否成功
         """
-        import json
-
         try:
             self.logger.info("開始備份資料庫記錄...")
-            records = list(self.collection.find({}))
-
-            # 轉換 ObjectId 為字串
-            for record in records:
-                if '_id' in record:
-                    record['_id'] = str(record['_id'])
-                if 'files' in record and 'raw' in record['files']:
-                    if 'fileId' in record['files']['raw'] and record['files']['raw']['fileId']:
-                        record['files']['raw']['fileId'] = str(record['files']['raw']['fileId'])
-                # 轉換 datetime 物件
-                if 'created_at' in record:
-                    record['created_at'] = str(record['created_at'])
-                if 'updated_at' in record:
-                    record['updated_at'] = str(record['updated_at'])
 
             # 確保備份目錄存在
             backup_file.parent.mkdir(parents=True, exist_ok=True)
 
-            # 寫入 JSON 檔案
-            with open(backup_file, 'w', encoding='utf-8') as f:
-                json.dump(records, f, indent=2, ensure_ascii=False, default=str)
+            record_count = 0
+            with open(backup_file, 'wb', buffering=1 << 20) as f:
+                for record in self.collection.find({}):
+                    # 轉換 ObjectId 為字串
+                    if '_id' in record:
+                        record['_id'] = str(record['_id'])
+                    if 'files' in record and 'raw' in record['files']:
+                        if 'fileId' in record['files']['raw'] and record['files']['raw']['fileId']:
+                            record['files']['raw']['fileId'] = str(record['files']['raw']['fileId'])
+                    # 轉換 datetime 物件
+                    if 'created_at' in record:
+                        record['created_at'] = str(record['created_at'])
+                    if 'updated_at' in record:
+                        record['updated_at'] = str(record['updated_at'])
+
+                    f.write(dumps_json_line(record))
+                    f.write(b'\n')
+                    record_count += 1
+
+            # 寫入校驗檔，供還原前快速驗證完整性
+            sidecar = write_checksum_sidecar(backup_file)
 
-            self.logger.info(f"✓ 備份完成：{backup_file} ({len(records)} 筆記錄)")
+            self.logger.info(f"✓ 備份完成：{backup_file} ({record_count} 筆記錄)")
+            self.logger.info(f"✓ 校驗檔：{sidecar}")
             return True
 
         except Exception as exc:
@@ -304,12 +944,73 @@ class MongoDBUploader:
             self.logger.error(f"✗ 刪除記錄失敗：{exc}")
             return 0
 
-    def restore_from_backup(self, backup_file: Path) -> Dict[str, int]:
+    @staticmethod
+    def _prepare_restore_record(record: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        將備份記錄中的字串 ID 轉換回 ObjectId
+
+        Args:
+            record: 備份中的單筆記錄
+
+        Returns:
+            可直接插入的記錄
+        """
+        if '_id' in record and isinstance(record['_id'], str):
+            try:
+                record['_id'] = ObjectId(record['_id'])
+            except Exception:
+                # 如果轉換失敗，移除 _id 讓 MongoDB 自動生成
+                del record['_id']
+
+        if 'files' in record and 'raw' in record['files']:
+            if 'fileId' in record['files']['raw'] and isinstance(record['files']['raw']['fileId'], str):
+                try:
+                    record['files']['raw']['fileId'] = ObjectId(record['files']['raw']['fileId'])
+                except Exception:
+                    # GridFS 檔案 ID 轉換失敗，保持為 None
+                    record['files']['raw']['fileId'] = None
+
+        # 轉換日期字串回 datetime（如果是字串格式）
+        # 注意：這裡簡化處理，實際可能需要更複雜的日期解析
+        return record
+
+    def _insert_restore_batch(self, batch: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """
+        以 insert_many(ordered=False) 插入一批還原記錄
+
+        Args:
+            batch: 記錄列表
+
+        Returns:
+            (inserted, skipped) tuple
+        """
+        if not batch:
+            return 0, 0
+
+        try:
+            result = self.collection.insert_many(batch, ordered=False)
+            return len(result.inserted_ids), 0
+        except BulkWriteError as exc:
+            inserted = exc.details.get('nInserted', 0)
+            for error in exc.details.get('writeErrors', []):
+                # 如果是重複 _id，跳過
+                if error.get('code') == 11000:
+                    self.logger.debug("跳過重複記錄：%s", error.get('op', {}).get('AnalyzeUUID', 'unknown'))
+                else:
+                    self.logger.warning(f"還原記錄失敗：{error.get('errmsg')}")
+            return inserted, len(batch) - inserted
+        except Exception as exc:
+            self.logger.warning(f"還原記錄失敗：{exc}")
+            return 0, len(batch)
+
+    def restore_from_backup(self, backup_file: Path, batch_size: int = 1000) -> Dict[str, int]:
         """
         從備份檔還原記錄
+        .ndjson 備份逐行讀取並分批 insert_many；舊版 .json（單一陣列）仍可還原
 
         Args:
             backup_file: 備份檔案路徑
+            batch_size: 每批插入的記錄數
 
         Returns:
             包含 inserted 和 skipped 數量的字典
@@ -319,46 +1020,28 @@ class MongoDBUploader:
         try:
             self.logger.info(f"開始從備份檔還原：{backup_file}")
 
-            # 讀取備份檔案
-            with open(backup_file, 'r', encoding='utf-8') as f:
-                records = json.load(f)
-
             inserted_count = 0
             skipped_count = 0
+            batch: List[Dict[str, Any]] = []
 
-            for record in records:
-                try:
-                    # 轉換字串 ID 回 ObjectId
-                    if '_id' in record and isinstance(record['_id'], str):
-                        try:
-                            record['_id'] = ObjectId(record['_id'])
-                        except Exception:
-                            # 如果轉換失敗，移除 _id 讓 MongoDB 自動生成
-                            del record['_id']
+            with open(backup_file, 'r', encoding='utf-8') as f:
+                if backup_file.suffix == '.ndjson':
+                    records = (json.loads(line) for line in f if line.strip())
+                else:
+                    # 舊格式：整份 JSON 陣列
+                    records = iter(json.load(f))
 
-                    if 'files' in record and 'raw' in record['files']:
-                        if 'fileId' in record['files']['raw'] and isinstance(record['files']['raw']['fileId'], str):
-                            try:
-                                record['files']['raw']['fileId'] = ObjectId(record['files']['raw']['fileId'])
-                            except Exception:
-                                # GridFS 檔案 ID 轉換失敗，保持為 None
-                                record['files']['raw']['fileId'] = None
-
-                    # 轉換日期字串回 datetime（如果是字串格式）
-                    # 注意：這裡簡化處理，實際可能需要更複雜的日期解析
-
-                    # 插入記錄
-                    self.collection.insert_one(record)
-                    inserted_count += 1
-
-                except Exception as e:
-                    # 如果是重複 _id，跳過
-                    if 'duplicate key error' in str(e).lower():
-                        skipped_count += 1
-                        self.logger.debug(f"跳過重複記錄：{record.get('AnalyzeUUID', 'unknown')}")
-                    else:
-                        skipped_count += 1
-                        self.logger.warning(f"還原記錄失敗：{e}")
+                for record in records:
+                    batch.append(self._prepare_restore_record(record))
+                    if len(batch) >= batch_size:
+                        inserted, skipped = self._insert_restore_batch(batch)
+                        inserted_count += inserted
+                        skipped_count += skipped
+                        batch = []
+
+            inserted, skipped = self._insert_restore_batch(batch)
+            inserted_count += inserted
+            skipped_count += skipped
 
             self.logger.info(f"✓ 還原完成：插入 {inserted_count} 筆，跳過 {skipped_count} 筆")
             return {'inserted': inserted_count, 'skipped': skipped_count}
@@ -368,7 +1051,23 @@ class MongoDBUploader:
             return {'inserted': 0, 'skipped': 0}
 
     def close(self) -> None:
-        """關閉 MongoDB 連接"""
+        """
+        結束此上傳器的 MongoDB 使用（寫入剩餘的批次文件）
+        連線池由同一程序的其他上傳器共用，於程式結束時由 close_shared_clients 關閉
+        """
         if self.mongo_client:
-            self.mongo_client.close()
-            self.logger.info("已關閉 MongoDB 連線。")
+            self.flush()
+            self.mongo_client = None
+            self.logger.debug("已釋放 MongoDB 連線（連線池於程式結束時關閉）。")
+
+    @classmethod
+    def close_shared_clients(cls) -> None:
+        """關閉所有共用的 MongoClient"""
+        with cls._shared_clients_lock:
+            clients = list(cls._shared_clients.values())
+            cls._shared_clients.clear()
+        for client in clients:
+            client.close()
+
+
+atexit.register(MongoDBUploader.close_shared_clients)
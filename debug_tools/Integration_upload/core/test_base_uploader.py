@@ -0,0 +1,191 @@
+"""
+測試批次上傳器的寫入結果回收、逾時批次寫入、進度記錄檔、雜湊快取與大小預先篩選
+以 conftest 的 FakeCollection 取代 MongoDB，不需要實際的伺服器
+"""
+
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from . import base_uploader as base_uploader_module
+from .mongodb_handler import MongoDBUploader
+from .utils import calculate_file_hash, read_json_file
+from ..config.cpc_config import CPCUploadConfig
+from ..uploaders.cpc_uploader import CPCBatchUploader
+
+
+@pytest.fixture
+def upload_dir(tmp_path: Path) -> Path:
+    """上傳資料夾"""
+    directory = tmp_path / 'cpc_data'
+    directory.mkdir()
+    return directory
+
+
+def _write_file(directory: Path, name: str, content: bytes) -> Path:
+    """寫入測試檔案"""
+    path = directory / name
+    path.write_bytes(content)
+    return path
+
+
+def _wait_until(condition, timeout: float = 2.0) -> bool:
+    """輪詢等待條件成立"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def test_duplicate_rejected_by_unique_index_counts_as_skipped(make_uploader, fake_collection, upload_dir):
+    """file_hash 唯一索引拒絕的文件由成功改計為跳過，並記入進度"""
+    uploader = make_uploader(CPCBatchUploader, CPCUploadConfig, str(upload_dir))
+    file_path = _write_file(upload_dir, 'a.wav', b'duplicate content')
+    fake_collection.write_errors = [{
+        'index': 0, 'code': 11000, 'keyPattern': {'info_features.file_hash': 1}, 'errmsg': 'E11000',
+    }]
+
+    assert uploader.upload_single_file(file_path, 'factory_ambient')
+    uploader.uploader.flush()
+    uploader._apply_insert_results()
+
+    assert uploader.stats['success'] == 0
+    assert uploader.stats['skipped'] == 1
+    assert uploader.stats['labels']['factory_ambient'] == 0
+    assert calculate_file_hash(file_path) in uploader.progress['uploaded_files']
+    assert uploader._queued_files == {}
+    assert fake_collection.documents == []
+
+
+def test_failed_insert_counts_as_failed(make_uploader, fake_collection, upload_dir):
+    """寫入失敗的文件由成功改計為失敗，不記入進度"""
+    uploader = make_uploader(CPCBatchUploader, CPCUploadConfig, str(upload_dir))
+    file_path = _write_file(upload_dir, 'a.wav', b'content')
+    fake_collection.write_errors = [{'index': 0, 'code': 121, 'errmsg': 'validation failed'}]
+
+    uploader.upload_single_file(file_path, 'factory_ambient')
+    uploader.uploader.flush()
+    uploader._apply_insert_results()
+
+    assert uploader.stats['success'] == 0
+    assert uploader.stats['failed'] == 1
+    assert uploader.stats['failed_files'] == [str(file_path)]
+    assert not uploader.progress['uploaded_files']
+
+
+def test_stale_batch_is_written_by_timer(make_uploader, fake_collection, monkeypatch, upload_dir):
+    """未滿一批的文件等待超過 INSERT_FLUSH_INTERVAL 後，不需下一筆文件也會寫入並記入進度"""
+    monkeypatch.setattr(MongoDBUploader, 'INSERT_FLUSH_INTERVAL', 0.05)
+    uploader = make_uploader(CPCBatchUploader, CPCUploadConfig, str(upload_dir))
+    file_path = _write_file(upload_dir, 'a.wav', b'slow link')
+
+    assert uploader.upload_single_file(file_path, 'factory_ambient')
+    assert uploader.stats['success'] == 1
+
+    file_hash = calculate_file_hash(file_path)
+    assert _wait_until(lambda: file_hash in uploader.progress['uploaded_files'])
+    assert len(fake_collection.documents) == 1
+    assert uploader._queued_files == {}
+
+
+def test_full_batch_cancels_timer(make_uploader, fake_collection, monkeypatch, upload_dir):
+    """批次因數量寫入後，該批的計時器取消，不會重複寫入"""
+    monkeypatch.setattr(MongoDBUploader, 'INSERT_BATCH_SIZE', 2)
+    monkeypatch.setattr(MongoDBUploader, 'INSERT_FLUSH_INTERVAL', 0.05)
+    uploader = make_uploader(CPCBatchUploader, CPCUploadConfig, str(upload_dir))
+
+    for idx in range(2):
+        uploader.upload_single_file(_write_file(upload_dir, f'{idx}.wav', bytes([idx]) * 8), 'factory_ambient')
+
+    assert len(fake_collection.documents) == 2
+    assert uploader.uploader._flush_timer is None
+    time.sleep(0.1)
+    assert len(fake_collection.documents) == 2
+
+
+def test_progress_log_replay_ignores_torn_line(make_uploader, monkeypatch, upload_dir):
+    """追加記錄檔的完整行會在下次載入時併入進度，中斷時寫到一半的最後一行則忽略"""
+    monkeypatch.setattr(base_uploader_module.BaseBatchUploader, 'PROGRESS_FLUSH_EVERY', 1)
+    uploader = make_uploader(CPCBatchUploader, CPCUploadConfig, str(upload_dir))
+    uploader._record_progress(['hash_a', 'hash_b'])
+    with open(uploader._progress_log_path, 'a', encoding='utf-8') as log:
+        log.write('hash_c')
+
+    reloaded = make_uploader(CPCBatchUploader, CPCUploadConfig, str(upload_dir))
+
+    assert reloaded.progress['uploaded_files'] == {'hash_a', 'hash_b'}
+    assert not uploader._progress_path.exists()
+
+
+def test_progress_log_compaction(make_uploader, monkeypatch, upload_dir):
+    """記錄檔筆數達 max(PROGRESS_COMPACT_EVERY, 已上傳總數) 時壓實回 JSON 並清除記錄檔"""
+    monkeypatch.setattr(base_uploader_module.BaseBatchUploader, 'PROGRESS_FLUSH_EVERY', 1)
+    monkeypatch.setattr(base_uploader_module.BaseBatchUploader, 'PROGRESS_COMPACT_EVERY', 3)
+    uploader = make_uploader(CPCBatchUploader, CPCUploadConfig, str(upload_dir))
+
+    uploader._record_progress(['h1', 'h2'])
+    assert uploader._progress_log_path.exists()
+    assert not uploader._progress_path.exists()
+
+    uploader._record_progress(['h3'])
+    assert not uploader._progress_log_path.exists()
+    snapshot = read_json_file(uploader._progress_path)
+    assert snapshot['datasets']['CPC']['uploaded_files'] == ['h1', 'h2', 'h3']
+
+    # 已上傳 3 筆，下一次壓實要再累積 max(3, 總數) 筆
+    uploader._record_progress(['h4', 'h5'])
+    assert uploader._progress_log_path.read_text(encoding='utf-8') == 'h4\nh5\n'
+
+
+def test_hash_cache_reused_until_file_changes(make_uploader, monkeypatch, upload_dir):
+    """大小與 mtime_ns 未變時沿用雜湊快取（跨上傳器），檔案變動後重新計算"""
+    calls = []
+
+    def counting_hash(file_path, algorithm='sha256'):
+        calls.append(file_path)
+        return calculate_file_hash(file_path, algorithm)
+
+    monkeypatch.setattr(base_uploader_module, 'calculate_file_hash', counting_hash)
+    file_path = _write_file(upload_dir, 'a.wav', b'first')
+    uploader = make_uploader(CPCBatchUploader, CPCUploadConfig, str(upload_dir))
+
+    first_hash = uploader.get_cached_file_hash(file_path)
+    assert uploader.get_cached_file_hash(file_path) == first_hash
+    assert len(calls) == 1
+    uploader._flush_progress()
+
+    reloaded = make_uploader(CPCBatchUploader, CPCUploadConfig, str(upload_dir))
+    assert reloaded.get_cached_file_hash(file_path) == first_hash
+    assert len(calls) == 1
+
+    file_path.write_bytes(b'changed content')
+    assert reloaded.get_cached_file_hash(file_path) == calculate_file_hash(file_path)
+    assert len(calls) == 2
+
+
+def test_size_prefilter_queries_candidate_sizes(make_uploader, fake_collection, upload_dir):
+    """大小預先篩選只以 $in 查詢本次檔案的大小；資料庫或本次已有相同大小的檔案仍需先計算雜湊"""
+    fake_collection.documents.append({'info_features': {'file_hash': 'x', 'file_size': 10}})
+    uploader = make_uploader(CPCBatchUploader, CPCUploadConfig, str(upload_dir), size_prefilter=True)
+    existing_size = _write_file(upload_dir, 'a.wav', bytes(10))
+    unique_size = _write_file(upload_dir, 'b.wav', bytes(20))
+    same_size = _write_file(upload_dir, 'c.wav', bytes(range(20)))
+    dataset_files = [(path, 'factory_ambient', None) for path in (existing_size, unique_size, same_size)]
+
+    uploader._load_existing_file_sizes(dataset_files)
+
+    assert 'file_size_idx' in fake_collection.indexes
+    size_query = fake_collection.queries[-1]['info_features.file_size']
+    assert sorted(size_query['$in']) == [10, 20]
+    assert not uploader._claim_unique_size(uploader._hash_cache_key(existing_size))
+    assert uploader._claim_unique_size(uploader._hash_cache_key(unique_size))
+    assert not uploader._claim_unique_size(uploader._hash_cache_key(same_size))
+
+    # 查詢後才出現的大小沒有比對過資料庫，不可略過預先雜湊
+    later = _write_file(upload_dir, 'd.wav', bytes(30))
+    assert not uploader._claim_unique_size(uploader._hash_cache_key(later))
+    assert os.path.abspath(unique_size) in uploader._unique_size_files
@@ -0,0 +1,98 @@
+"""
+測試 WAV 標頭解析與其改用 soundfile 的條件
+"""
+
+import struct
+from pathlib import Path
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from .utils import WAV_HEADER, parse_wav_header, read_wav_header
+
+
+def _build_wav(
+    frames: int = 100,
+    channels: int = 1,
+    sample_rate: int = 16000,
+    data_size: int = -1,
+    extra_chunk: bytes = b'',
+    audio_format: int = 1,
+    bits_per_sample: int = 16,
+) -> bytes:
+    """
+    組出 WAV 檔案內容（可在 fmt 與 data 之間插入額外 chunk，或填入指定的 data 大小）
+
+    Args:
+        frames: 取樣點數
+        channels: 聲道數
+        sample_rate: 取樣率
+        data_size: data chunk 標示的大小（-1 為實際大小）
+        extra_chunk: 插入在 fmt 之後的完整 chunk
+        audio_format: fmt 的格式代碼
+        bits_per_sample: 每個取樣的位元數
+
+    Returns:
+        WAV 檔案內容
+    """
+    block_align = channels * bits_per_sample // 8
+    data = bytes(frames * block_align)
+    fmt = struct.pack(
+        '<4sIHHIIHH', b'fmt ', 16, audio_format, channels, sample_rate,
+        sample_rate * block_align, block_align, bits_per_sample,
+    )
+    data_chunk = struct.pack('<4sI', b'data', len(data) if data_size < 0 else data_size) + data
+    body = b'WAVE' + fmt + extra_chunk + data_chunk
+    return struct.pack('<4sI', b'RIFF', len(body)) + body
+
+
+def test_parse_standard_header_matches_soundfile(tmp_path: Path):
+    """標準 44 位元組標頭的解析結果與 soundfile.info 相同"""
+    wav_path = tmp_path / 'standard.wav'
+    sf.write(str(wav_path), np.zeros((320, 2), dtype=np.int16), 8000, subtype='PCM_16')
+    file_size = wav_path.stat().st_size
+
+    wav_info = parse_wav_header(read_wav_header(wav_path), file_size)
+    info = sf.info(str(wav_path))
+
+    assert wav_info is not None
+    assert wav_info['duration'] == pytest.approx(info.duration)
+    assert wav_info['sample_rate'] == info.samplerate
+    assert wav_info['channels'] == info.channels
+    assert wav_info['subtype'] == info.subtype
+    assert wav_info['format'] == info.format
+
+
+@pytest.mark.parametrize('data_size', [0, 0xFFFFFFFF, 10 ** 9])
+def test_parse_header_uses_file_size_for_unset_data_size(data_size):
+    """data 大小未回填或超過檔案大小時，以檔案大小計算長度"""
+    content = _build_wav(frames=160, data_size=data_size)
+
+    wav_info = parse_wav_header(content, len(content))
+
+    assert wav_info['duration'] == pytest.approx(160 / 16000)
+
+
+@pytest.mark.parametrize('content', [
+    # 額外的 LIST chunk 位於 fmt 與 data 之間
+    _build_wav(extra_chunk=struct.pack('<4sI', b'LIST', 4) + b'INFO'),
+    # 不支援的格式代碼（WAVE_FORMAT_EXTENSIBLE）
+    _build_wav(audio_format=0xFFFE),
+    # 不支援的位元數
+    _build_wav(bits_per_sample=12),
+    # 標頭不完整
+    _build_wav()[:WAV_HEADER.size - 1],
+    # 不是 WAV
+    b'OggS' + bytes(60),
+])
+def test_parse_header_rejects_non_canonical_headers(content):
+    """非標準標頭回傳 None，由呼叫端改用 soundfile"""
+    assert parse_wav_header(content[:WAV_HEADER.size], len(content)) is None
+
+
+def test_read_wav_header_prefers_loaded_content(tmp_path: Path):
+    """已讀入檔案內容時直接取用，不開啟檔案"""
+    content = _build_wav()
+
+    assert read_wav_header(tmp_path / 'missing.wav', content) == content[:WAV_HEADER.size]
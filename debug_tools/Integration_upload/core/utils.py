@@ -1,16 +1,62 @@
 """
 共用函數模組
-提供檔案雜湊計算、JSON序列化、分析容器建立等共用功能
+提供檔案雜湊計算、JSON序列化、備份記錄計數與校驗、分析容器建立等共用功能
 """
 
 from __future__ import annotations
 
 import hashlib
+import json
+import os
+import struct
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
 
-from bson.objectid import ObjectId
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+
+
+CHECKSUM_SIDECAR_SUFFIX = '.xxh'
+
+# 檔案去重雜湊演算法（sha256 為預設，其餘需安裝對應套件）
+DEFAULT_HASH_ALGORITHM = 'sha256'
+HASH_ALGORITHMS = ('sha256', 'blake3', 'xxh3_128')
+
+# 雜湊計算每次讀取的區塊大小（4 MiB）
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+# 每個執行緒重複使用的雜湊讀取緩衝區（避免每個檔案重新配置並清零 HASH_CHUNK_SIZE 的記憶體）
+_hash_buffers = threading.local()
+
+# 標準 44 位元組 WAV 標頭：RIFF / fmt（16 位元組）/ data
+WAV_HEADER = struct.Struct('<4sI4s4sIHHIIHH4sI')
+
+# (audio_format, bits_per_sample) -> soundfile subtype 名稱
+_WAV_SUBTYPES = {
+    (1, 8): 'PCM_U8',
+    (1, 16): 'PCM_16',
+    (1, 24): 'PCM_24',
+    (1, 32): 'PCM_32',
+    (3, 32): 'FLOAT',
+    (3, 64): 'DOUBLE',
+}
 
 
 def build_analysis_container() -> Dict[str, Any]:
@@ -32,40 +78,417 @@ def build_analysis_container() -> Dict[str, Any]:
     }
 
 
-def calculate_file_hash(file_path: Path) -> str:
+def hash_algorithm_available(algorithm: str) -> bool:
+    """檢查雜湊演算法是否受支援且已安裝所需套件"""
+    if algorithm == 'blake3':
+        return BLAKE3_AVAILABLE
+    if algorithm == 'xxh3_128':
+        return XXHASH_AVAILABLE
+    return algorithm == 'sha256'
+
+
+def new_file_hasher(algorithm: str = DEFAULT_HASH_ALGORITHM) -> Any:
+    """
+    建立檔案去重用的雜湊物件
+
+    Args:
+        algorithm: 'sha256'、'blake3' 或 'xxh3_128'
+
+    Returns:
+        具有 update/hexdigest 的雜湊物件
+    """
+    if algorithm == 'sha256':
+        return hashlib.sha256()
+    if not hash_algorithm_available(algorithm):
+        raise RuntimeError(f"不支援或未安裝所需套件的雜湊演算法：{algorithm}")
+    if algorithm == 'blake3':
+        return blake3.blake3()
+    return xxhash.xxh3_128()
+
+
+def describe_hash_backend(algorithm: str = DEFAULT_HASH_ALGORITHM) -> str:
+    """
+    說明雜湊演算法實際使用的實作（供啟動時記錄）
+    hashlib 的 sha256 由 OpenSSL EVP 提供時，OpenSSL 會依 CPU 自動選用 SHA-NI/AVX2 等指令
+
+    Args:
+        algorithm: 雜湊演算法
+
+    Returns:
+        說明字串
+    """
+    if algorithm != 'sha256':
+        return algorithm
+    if type(hashlib.sha256()).__module__ == '_hashlib':
+        import ssl
+        return f"sha256（{ssl.OPENSSL_VERSION}）"
+    return "sha256（Python 內建實作，未連結 OpenSSL）"
+
+
+def calculate_file_hash(file_path: Path, algorithm: str = DEFAULT_HASH_ALGORITHM) -> str:
     """
-    計算檔案的 SHA-256 雜湊值
+    計算檔案的雜湊值
 
     Args:
         file_path: 檔案路徑
+        algorithm: 雜湊演算法（預設 SHA-256）
 
     Returns:
-        SHA-256 雜湊值（十六進位字串）
+        雜湊值（十六進位字串）
     """
-    sha256_hash = hashlib.sha256()
-    with open(file_path, 'rb') as handle:
-        for block in iter(lambda: handle.read(4096), b""):
-            sha256_hash.update(block)
-    return sha256_hash.hexdigest()
+    # 不經 BufferedReader，直接以 readinto 讀入雜湊用的緩衝區
+    with open(file_path, 'rb', buffering=0) as handle:
+        return _hash_handle(handle, algorithm)
+
+
+def _hash_handle(handle: Any, algorithm: str) -> str:
+    """
+    從已開啟的無緩衝檔案物件計算雜湊值
+
+    Args:
+        handle: 以 buffering=0 開啟的檔案物件
+        algorithm: 雜湊演算法
+
+    Returns:
+        雜湊值（十六進位字串）
+    """
+    # 與 hashlib.file_digest 相同的 readinto 迴圈，但以較大的區塊讀取並重複使用緩衝區；
+    # 每次 update 處理數 MB，hashlib 於計算期間釋放 GIL（OpenSSL 會使用 SHA-NI 等硬體指令）
+    view = getattr(_hash_buffers, 'view', None)
+    if view is None:
+        view = memoryview(bytearray(HASH_CHUNK_SIZE))
+        _hash_buffers.view = view
+    hasher = new_file_hasher(algorithm)
+    while size := handle.readinto(view):
+        hasher.update(view[:size])
+    return hasher.hexdigest()
+
+
+def open_sequential(file_path: Path) -> Any:
+    """
+    以無緩衝模式開啟檔案供循序串流讀取，並告知核心將循序讀取（posix_fadvise SEQUENTIAL，加大預讀；不支援的平台略過）
+
+    Args:
+        file_path: 檔案路徑
+
+    Returns:
+        檔案物件
+    """
+    handle = open(file_path, 'rb', buffering=0)
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(handle.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+    return handle
+
+
+def _open_prefetched(file_path: Path) -> Any:
+    """
+    以無緩衝模式開啟檔案，並請核心在背景預讀整個檔案（posix_fadvise WILLNEED，不支援的平台略過）
+
+    Args:
+        file_path: 檔案路徑
+
+    Returns:
+        檔案物件；開啟失敗時回傳例外物件，由呼叫端在輪到該檔案時再處理
+    """
+    try:
+        handle = open(file_path, 'rb', buffering=0)
+    except OSError as exc:
+        return exc
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(handle.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+    return handle
+
+
+def calculate_file_hashes(
+    file_paths: List[Path],
+    algorithm: str = DEFAULT_HASH_ALGORITHM
+) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    依序計算多個檔案的雜湊值（供行程池一次處理一批，攤銷每個任務的 IPC 成本）
+    計算目前檔案時已先開啟下一個檔案並要求核心預讀，讓磁碟讀取與雜湊計算重疊
+    單一檔案失敗不影響同批其他檔案
+
+    Args:
+        file_paths: 檔案路徑列表
+        algorithm: 雜湊演算法
+
+    Returns:
+        與輸入順序相同的 (雜湊值, 錯誤訊息) 列表，成功時錯誤訊息為 None，失敗時雜湊值為 None
+    """
+    results: List[Tuple[Optional[str], Optional[str]]] = []
+    next_handle = _open_prefetched(file_paths[0]) if file_paths else None
+    for index in range(len(file_paths)):
+        handle = next_handle
+        next_handle = _open_prefetched(file_paths[index + 1]) if index + 1 < len(file_paths) else None
+        try:
+            if isinstance(handle, Exception):
+                raise handle
+            with handle:
+                results.append((_hash_handle(handle, algorithm), None))
+        except Exception as exc:
+            results.append((None, str(exc)))
+    return results
+
+
+def get_progress_log_path(progress_file: Path, dataset_name: str) -> Path:
+    """
+    取得資料集的進度追加記錄檔路徑（與進度檔同目錄，例如 upload_progress.CPC.log）
+
+    Args:
+        progress_file: JSON 進度檔路徑
+        dataset_name: 資料集名稱
+
+    Returns:
+        記錄檔路徑
+    """
+    return progress_file.with_name(f"{progress_file.stem}.{dataset_name}.log")
+
+
+def read_and_hash_file(file_path: Path, algorithm: str = DEFAULT_HASH_ALGORITHM) -> Tuple[str, bytes]:
+    """
+    一次讀取整個檔案並計算雜湊值
+    讀出的內容可供後續解析中繼資料與上傳重複使用，避免多次讀取磁碟
+
+    Args:
+        file_path: 檔案路徑
+        algorithm: 雜湊演算法（預設 SHA-256）
+
+    Returns:
+        (雜湊值, 檔案內容) tuple
+    """
+    # 無緩衝 readall 依檔案大小一次配置並讀入，不經 BufferedReader
+    with open(file_path, 'rb', buffering=0) as handle:
+        file_data = handle.readall()
+    hasher = new_file_hasher(algorithm)
+    hasher.update(file_data)
+    return hasher.hexdigest(), file_data
+
+
+def read_wav_header(file_path: Path, file_data: Optional[bytes] = None) -> bytes:
+    """
+    取得 WAV 標頭位元組（優先使用已讀入的內容，否則只讀取檔案開頭）
+
+    Args:
+        file_path: 檔案路徑
+        file_data: 已讀入的檔案內容（可選）
+
+    Returns:
+        檔案開頭 WAV_HEADER.size 位元組（檔案較短時可較少）
+    """
+    if file_data is not None:
+        return file_data[:WAV_HEADER.size]
+    with open(file_path, 'rb', buffering=0) as handle:
+        return handle.read(WAV_HEADER.size)
+
+
+def parse_wav_header(header: bytes, file_size: int) -> Optional[Dict[str, Any]]:
+    """
+    解析標準 44 位元組 WAV 標頭，取得與 soundfile.info 相同的欄位
+    非標準標頭（額外 chunk、WAVE_FORMAT_EXTENSIBLE 等）回傳 None，呼叫端應改用 soundfile
+
+    Args:
+        header: 檔案開頭至少 44 位元組
+        file_size: 檔案大小（位元組）
+
+    Returns:
+        包含 duration、sample_rate、channels、subtype、format 的字典，無法解析時為 None
+    """
+    if len(header) < WAV_HEADER.size:
+        return None
+
+    (riff, _, wave, fmt_id, fmt_size, audio_format, channels, sample_rate,
+     _, block_align, bits_per_sample, data_id, data_size) = WAV_HEADER.unpack_from(header)
+
+    if riff != b'RIFF' or wave != b'WAVE' or fmt_id != b'fmt ' or fmt_size != 16 or data_id != b'data':
+        return None
+
+    subtype = _WAV_SUBTYPES.get((audio_format, bits_per_sample))
+    if subtype is None or not channels or not sample_rate or not block_align:
+        return None
+
+    # 串流錄製的檔案可能沒有回填 data 大小
+    available = file_size - WAV_HEADER.size
+    if data_size in (0, 0xFFFFFFFF) or data_size > available:
+        data_size = available
+
+    frames = data_size // block_align
+    return {
+        'duration': frames / sample_rate,
+        'sample_rate': sample_rate,
+        'channels': channels,
+        'subtype': subtype,
+        'format': 'WAV',
+    }
+
+
+def count_backup_records(backup_file: Path) -> int:
+    """
+    計算備份檔的記錄數
+    .ndjson 以區塊方式計算換行數，不需解析 JSON；舊版 .json 則載入陣列計算長度
+
+    Args:
+        backup_file: 備份檔案路徑
+
+    Returns:
+        記錄數
+    """
+    if backup_file.suffix == '.ndjson':
+        count = 0
+        last_byte = ord("\n")
+        buffer = bytearray(HASH_CHUNK_SIZE)
+        with open(backup_file, 'rb', buffering=0) as handle:
+            while size := handle.readinto(buffer):
+                count += buffer.count(b"\n", 0, size)
+                last_byte = buffer[size - 1]
+        # 最後一行沒有換行符號時仍算一筆
+        if last_byte != ord("\n"):
+            count += 1
+        return count
+
+    with open(backup_file, 'r', encoding='utf-8') as handle:
+        return len(json.load(handle))
+
+
+def _new_checksum(algorithm: str) -> Any:
+    """依演算法名稱建立雜湊物件（xxh3_64 或 blake2b）"""
+    if algorithm == 'xxh3_64':
+        if not XXHASH_AVAILABLE:
+            raise RuntimeError("校驗檔使用 xxh3_64，但未安裝 xxhash 套件")
+        return xxhash.xxh3_64()
+    return hashlib.blake2b(digest_size=8)
+
+
+def calculate_backup_checksum(backup_file: Path, algorithm: str) -> str:
+    """
+    計算備份檔的校驗值
+
+    Args:
+        backup_file: 備份檔案路徑
+        algorithm: 'xxh3_64' 或 'blake2b'
+
+    Returns:
+        校驗值（十六進位字串）
+    """
+    checksum = _new_checksum(algorithm)
+    buffer = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(backup_file, 'rb', buffering=0) as handle:
+        while size := handle.readinto(buffer):
+            checksum.update(view[:size])
+    return checksum.hexdigest()
+
+
+def get_checksum_sidecar(backup_file: Path) -> Path:
+    """取得備份檔對應的校驗檔路徑（backup_<ts>.xxh）"""
+    return backup_file.with_suffix(CHECKSUM_SIDECAR_SUFFIX)
+
+
+def write_checksum_sidecar(backup_file: Path) -> Path:
+    """
+    寫入備份檔的校驗檔
+    優先使用 xxh3_64，未安裝 xxhash 時改用標準庫的 blake2b
+
+    Args:
+        backup_file: 備份檔案路徑
+
+    Returns:
+        校驗檔路徑
+    """
+    algorithm = 'xxh3_64' if XXHASH_AVAILABLE else 'blake2b'
+    sidecar = get_checksum_sidecar(backup_file)
+    sidecar.write_text(f"{algorithm}:{calculate_backup_checksum(backup_file, algorithm)}\n", encoding='utf-8')
+    return sidecar
+
+
+def verify_checksum_sidecar(backup_file: Path) -> Optional[bool]:
+    """
+    以校驗檔驗證備份檔完整性
+
+    Args:
+        backup_file: 備份檔案路徑
+
+    Returns:
+        True 表示一致，False 表示不一致，None 表示沒有校驗檔
+    """
+    sidecar = get_checksum_sidecar(backup_file)
+    if not sidecar.exists():
+        return None
+
+    algorithm, _, expected = sidecar.read_text(encoding='utf-8').strip().partition(':')
+    return calculate_backup_checksum(backup_file, algorithm) == expected
+
+
+def write_json_file(file_path: Path, payload: Any) -> None:
+    """
+    以縮排 2 格寫入 JSON 檔案
+    已安裝 orjson 時使用 C 實作的編碼器，否則使用標準庫 json
+
+    Args:
+        file_path: 輸出檔案路徑
+        payload: 要寫入的資料
+    """
+    if ORJSON_AVAILABLE:
+        file_path.write_bytes(
+            orjson.dumps(payload, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS, default=json_default)
+        )
+        return
+
+    with file_path.open('w', encoding='utf-8') as handle:
+        json.dump(payload, handle, indent=2, ensure_ascii=False, default=json_default)
+
+
+def dumps_json_line(record: Any) -> bytes:
+    """
+    將單筆記錄編碼為一行 JSON（UTF-8，不含換行），供 NDJSON 備份逐筆寫出
+    已安裝 orjson 時使用 C 實作的編碼器；datetime 等非原生型別一律以 str() 轉換，兩種實作輸出相同
+
+    Args:
+        record: 要編碼的記錄
+
+    Returns:
+        UTF-8 編碼的 JSON 位元組
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(
+            record, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS, default=str
+        )
+    return json.dumps(record, ensure_ascii=False, default=str).encode('utf-8')
+
+
+def read_json_file(file_path: Path) -> Any:
+    """
+    讀取 JSON 檔案（已安裝 orjson 時使用 orjson 解析）
+
+    Args:
+        file_path: 檔案路徑
+
+    Returns:
+        解析後的資料
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.loads(file_path.read_bytes())
+
+    with file_path.open('r', encoding='utf-8') as handle:
+        return json.load(handle)
 
 
-def to_json_serializable(data: Any) -> Any:
+def json_default(value: Any) -> Any:
     """
-    將資料轉換為 JSON 可序列化格式
-    遞迴處理字典、列表，並轉換特殊類型（datetime、ObjectId）
+    JSON 編碼器的 default 回呼，只在遇到非 JSON 原生型別的葉節點時呼叫
+    字典與列表由 C 實作的編碼器直接走訪，不需事先遞迴複製整份資料
 
     Args:
-        data: 要轉換的資料
+        value: 無法直接編碼的值（datetime、ObjectId 等）
 
     Returns:
-        JSON 可序列化的資料
+        可編碼的值（datetime 轉為 ISO 8601，其餘轉為字串）
     """
-    if isinstance(data, dict):
-        return {k: to_json_serializable(v) for k, v in data.items()}
-    if isinstance(data, list):
-        return [to_json_serializable(item) for item in data]
-    if isinstance(data, datetime):
-        return data.isoformat()
-    if isinstance(data, ObjectId):
-        return str(data)
-    return data
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
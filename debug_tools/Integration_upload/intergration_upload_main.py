@@ -5,9 +5,10 @@
 
 from __future__ import annotations
 
-import json
 import logging
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Tuple
@@ -26,6 +27,15 @@ from debug_tools.Integration_upload.uploaders.cpc_uploader import CPCBatchUpload
 from debug_tools.Integration_upload.uploaders.mafaulda_uploader import MAFAULDABatchUploader
 from debug_tools.Integration_upload.uploaders.mimii_uploader import MIMIIBatchUploader
 from debug_tools.Integration_upload.core.mongodb_handler import MongoDBUploader
+from debug_tools.Integration_upload.core.utils import (
+    CHECKSUM_SIDECAR_SUFFIX,
+    count_backup_records,
+    get_checksum_sidecar,
+    get_progress_log_path,
+    read_json_file,
+    verify_checksum_sidecar,
+    write_json_file,
+)
 
 
 PACKAGE_PREFIX = "debug_tools.Integration_upload"
@@ -58,8 +68,13 @@ class IntegrationUploadCLI:
             logging_config=BaseUploadConfig.LOGGING_CONFIG
         )
         self.progress_file = Path(BaseUploadConfig.PROGRESS_FILE)
+        self._mongo_cfg: Dict[str, Any] = BaseUploadConfig.MONGODB_CONFIG
+        self._report_dir = Path(BaseUploadConfig.REPORT_OUTPUT['report_directory'])
+        self._backups_dir = self._report_dir / 'backups'
         self.selected_datasets: List[str] = []
         self.uploaders: List[Tuple[str, Any]] = []
+        # 本次執行中數量預覽的掃描結果（資料集名稱 -> export_scan_result），正式上傳時交給新建的上傳器沿用
+        self._scan_results: Dict[str, Any] = {}
         self.total_stats: Dict[str, Any] = {
             'total': 0,
             'success': 0,
@@ -81,7 +96,7 @@ class IntegrationUploadCLI:
         print("資料庫連線資訊")
         print("-" * 35)
 
-        mongodb_config = BaseUploadConfig.MONGODB_CONFIG
+        mongodb_config = self._mongo_cfg
 
         # 顯示基本連線資訊
         print(f"Host: {mongodb_config['host']}")
@@ -137,8 +152,6 @@ class IntegrationUploadCLI:
         Returns:
             使用者是否確認繼續
         """
-        from debug_tools.Integration_upload.core.utils import calculate_file_hash
-
         print("\n" + "=" * 70)
         print("步驟3：預覽上傳數量")
         print("=" * 70)
@@ -164,7 +177,9 @@ class IntegrationUploadCLI:
 
                 # 建立臨時上傳器來掃描檔案
                 temp_uploader = uploader_class(logger=self.logger)
-                files = temp_uploader.scan_directory()
+                # 保留掃描結果，正式上傳時不再重新走訪資料夾
+                files = temp_uploader.discover_files()
+                self._scan_results[dataset_name] = temp_uploader.export_scan_result()
                 scanned_total = len(files)
 
                 # 取得上傳行為配置
@@ -178,16 +193,8 @@ class IntegrationUploadCLI:
                 for file_path, label, _ in files:
                     scanned_label_counts[label] = scanned_label_counts.get(label, 0) + 1
 
-                # 應用 per_label_limit 限制
-                if per_label_limit and per_label_limit > 0:
-                    filtered_files = []
-                    label_counts = {}
-                    for file_path, label, metadata in files:
-                        count = label_counts.get(label, 0)
-                        if count < per_label_limit:
-                            label_counts[label] = count + 1
-                            filtered_files.append((file_path, label, metadata))
-                    files = filtered_files
+                # 應用 per_label_limit 限制（與正式上傳使用相同的採樣邏輯，例如 MAFAULDA 依 fault_variant 輪流選取）
+                files = temp_uploader.apply_label_limit(files)
 
                 # 應用 skip_existing 和 check_duplicates 檢查（根據選定模式）
                 actual_files = []
@@ -202,13 +209,18 @@ class IntegrationUploadCLI:
                     for file_path, label, _ in files:
                         actual_label_counts[label] = actual_label_counts.get(label, 0) + 1
                 elif skip_existing and check_duplicates:
-                    # 需要檢查每個檔案是否已存在
-                    for file_path, label, metadata in files:
-                        # 計算檔案 hash
-                        file_hash = calculate_file_hash(file_path)
+                    # 先計算所有檔案 hash（大小與修改時間未變時沿用快取）
+                    file_hashes = [temp_uploader.get_cached_file_hash(file_path) for file_path, _, _ in files]
+
+                    # 以 $in 一次查詢這些 hash 中已存在於資料庫者
+                    if not delete_database:
+                        temp_uploader.uploader.preload_existing_hashes(file_hashes)
 
+                    # 需要檢查每個檔案是否已存在（進度中的雜湊值為 set，查詢為 O(1)）
+                    uploaded_files = set() if delete_progress else temp_uploader.progress['uploaded_files']
+                    for (file_path, label, metadata), file_hash in zip(files, file_hashes):
                         # 檢查進度檔案（只有在不刪除進度時才檢查）
-                        if not delete_progress and file_hash in temp_uploader.progress.get('uploaded_files', []):
+                        if file_hash in uploaded_files:
                             skipped_existing += 1
                             continue
 
@@ -235,7 +247,8 @@ class IntegrationUploadCLI:
                     'skipped_existing': skipped_existing,
                     'skipped_duplicate': skipped_duplicate,
                     'per_label_limit': per_label_limit,
-                    'has_limit': per_label_limit and per_label_limit > 0
+                    'has_limit': per_label_limit and per_label_limit > 0,
+                    'folder_capped': temp_uploader.caps_leaf_folder_files,
                 }
 
                 total_files += preview_data[dataset_name]['scanned']
@@ -262,7 +275,10 @@ class IntegrationUploadCLI:
 
         for dataset_name, data in preview_data.items():
             print(f"\n{dataset_name}：")
-            print(f"  掃描到：{data['scanned']:,} 個檔案")
+            if data['folder_capped']:
+                print(f"  掃描到：{data['scanned']:,} 個檔案（每個標籤資料夾最多讀取 {data['per_label_limit']:,} 個）")
+            else:
+                print(f"  掃描到：{data['scanned']:,} 個檔案")
 
             if data['has_limit']:
                 print(f"  套用限制後：{data['after_limit']:,} 個檔案（每類別上限：{data['per_label_limit']:,}）")
@@ -302,20 +318,28 @@ class IntegrationUploadCLI:
         Returns:
             是否存在進度
         """
+        # 尚未壓實的追加記錄檔也代表有進度
+        for dataset_name in self.selected_datasets:
+            log_path = get_progress_log_path(self.progress_file, dataset_name)
+            try:
+                if log_path.stat().st_size > 0:
+                    return True
+            except OSError:
+                pass
+
         if not self.progress_file.exists():
             return False
 
         try:
-            with self.progress_file.open('r', encoding='utf-8') as f:
-                data = json.load(f)
-                # 檢查是否有任何資料集的進度
-                if 'datasets' in data:
-                    for dataset_name in self.selected_datasets:
-                        if dataset_name in data['datasets']:
-                            uploaded_files = data['datasets'][dataset_name].get('uploaded_files', [])
-                            if uploaded_files:
-                                return True
-                return False
+            data = read_json_file(self.progress_file)
+            # 檢查是否有任何資料集的進度
+            if 'datasets' in data:
+                for dataset_name in self.selected_datasets:
+                    if dataset_name in data['datasets']:
+                        uploaded_files = data['datasets'][dataset_name].get('uploaded_files', [])
+                        if uploaded_files:
+                            return True
+            return False
         except Exception:
             return False
 
@@ -434,10 +458,38 @@ class IntegrationUploadCLI:
                     print("無效的選項，請重新輸入。")
 
     def delete_progress(self) -> None:
-        """刪除進度文件"""
+        """
+        刪除上傳進度（含各資料集的追加記錄檔）
+        雜湊快取以檔案大小與 mtime_ns 驗證、與上傳狀態無關，因此保留，重新開始時不必重新計算雜湊
+        """
+        for dataset_name in self.DATASET_MAP:
+            log_path = get_progress_log_path(self.progress_file, dataset_name)
+            try:
+                log_path.unlink(missing_ok=True)
+            except Exception as e:
+                self.logger.warning(f"無法刪除進度記錄檔：{e}")
+
         if self.progress_file.exists():
             try:
-                self.progress_file.unlink()
+                hash_caches = {}
+                try:
+                    data = read_json_file(self.progress_file)
+                    for dataset_name, dataset_progress in data.get('datasets', {}).items():
+                        if dataset_progress.get('hash_cache'):
+                            hash_caches[dataset_name] = {
+                                'uploaded_files': [],
+                                'hash_cache': dataset_progress['hash_cache'],
+                            }
+                except Exception as e:
+                    self.logger.warning(f"無法讀取進度文件中的雜湊快取：{e}")
+
+                if hash_caches:
+                    # 與上傳器相同：先寫入暫存檔再取代，中斷時不會同時失去進度與雜湊快取
+                    tmp_path = self.progress_file.with_name(f"{self.progress_file.name}.tmp")
+                    write_json_file(tmp_path, {'datasets': hash_caches})
+                    os.replace(tmp_path, self.progress_file)
+                else:
+                    self.progress_file.unlink()
                 self.logger.info("已刪除先前的進度文件。")
                 print("\n✓ 已刪除先前的進度文件。")
             except Exception as e:
@@ -454,7 +506,7 @@ class IntegrationUploadCLI:
         print("資料庫刪除與備份")
         print("=" * 70)
 
-        mongodb_config = BaseUploadConfig.MONGODB_CONFIG
+        mongodb_config = self._mongo_cfg
 
         try:
             # 建立連線
@@ -502,11 +554,11 @@ class IntegrationUploadCLI:
 
             # 建立備份
             print("\n正在備份資料庫...")
-            backup_dir = Path(BaseUploadConfig.REPORT_OUTPUT['report_directory']) / 'backups'
+            backup_dir = self._backups_dir
             backup_dir.mkdir(parents=True, exist_ok=True)
 
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_file = backup_dir / f"backup_{timestamp}.json"
+            backup_file = backup_dir / f"backup_{timestamp}.ndjson"
 
             if not uploader.backup_all_records(backup_file):
                 print("\n✗ 備份失敗，取消刪除操作。")
@@ -545,14 +597,23 @@ class IntegrationUploadCLI:
         print("選擇備份檔還原")
         print("=" * 70)
 
-        backup_dir = Path(BaseUploadConfig.REPORT_OUTPUT['report_directory']) / 'backups'
+        backup_dir = self._backups_dir
 
         if not backup_dir.exists():
             print("\n✗ 備份目錄不存在")
             return None
 
-        # 掃描備份檔案
-        backup_files = sorted(backup_dir.glob('backup_*.json'), key=lambda p: p.stat().st_mtime, reverse=True)
+        # 掃描備份檔案（單次 scandir，DirEntry 會快取 stat 結果）
+        with os.scandir(backup_dir) as entries:
+            all_entries = list(entries)
+        backup_entries = [
+            entry for entry in all_entries
+            if entry.name.startswith('backup_') and entry.name.endswith(('.ndjson', '.json'))
+            and entry.is_file()
+        ]
+        sidecar_names = {entry.name for entry in all_entries if entry.name.endswith(CHECKSUM_SIDECAR_SUFFIX)}
+        backup_entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        backup_files = [Path(entry.path) for entry in backup_entries]
 
         if not backup_files:
             print("\n✗ 沒有找到備份檔案")
@@ -561,9 +622,8 @@ class IntegrationUploadCLI:
         print("\n可用的備份檔案：")
         print("-" * 70)
 
-        import os
-        for idx, backup_file in enumerate(backup_files, 1):
-            file_stat = backup_file.stat()
+        for idx, (backup_entry, backup_file) in enumerate(zip(backup_entries, backup_files), 1):
+            file_stat = backup_entry.stat()
             file_size_mb = file_stat.st_size / (1024 * 1024)
             file_time = datetime.fromtimestamp(file_stat.st_mtime)
 
@@ -572,13 +632,13 @@ class IntegrationUploadCLI:
 
             # 嘗試讀取檔案以取得記錄數
             try:
-                with open(backup_file, 'r', encoding='utf-8') as f:
-                    records = json.load(f)
-                    print(f"   筆數: {len(records):,} 筆")
+                print(f"   筆數: {count_backup_records(backup_file):,} 筆")
             except Exception:
                 print(f"   筆數: 無法讀取")
 
             print(f"   大小: {file_size_mb:.2f} MB")
+            has_sidecar = get_checksum_sidecar(backup_file).name in sidecar_names
+            print(f"   校驗檔: {'有' if has_sidecar else '無'}")
 
         print("\n" + "-" * 70)
         print("請選擇要還原的備份檔 (輸入編號) 或 q 取消: ", end='')
@@ -614,7 +674,24 @@ class IntegrationUploadCLI:
         print("資料庫還原")
         print("=" * 70)
 
-        mongodb_config = BaseUploadConfig.MONGODB_CONFIG
+        # 還原前先以校驗檔驗證備份完整性
+        try:
+            verified = verify_checksum_sidecar(backup_file)
+        except Exception as e:
+            self.logger.error(f"驗證備份檔時發生錯誤：{e}")
+            print(f"\n✗ 無法驗證備份檔：{e}")
+            return False
+
+        if verified is False:
+            self.logger.error(f"備份檔校驗失敗：{backup_file}")
+            print(f"\n✗ 備份檔校驗失敗，檔案可能已損毀：{backup_file.name}")
+            return False
+        if verified:
+            print("\n✓ 備份檔校驗通過")
+        else:
+            print("\n⚠️  找不到校驗檔，略過完整性檢查")
+
+        mongodb_config = self._mongo_cfg
 
         try:
             # 建立連線
@@ -663,9 +740,38 @@ class IntegrationUploadCLI:
             print(f"\n✗ 還原資料庫失敗：{e}")
             return False
 
+    def _init_one(self, dataset_name: str) -> Tuple[Any, List[str]]:
+        """
+        初始化單一資料集的上傳器
+
+        Args:
+            dataset_name: 資料集名稱
+
+        Returns:
+            (uploader, errors) tuple，配置有誤時 uploader 為 None
+        """
+        uploader_class, config_module, config_class_name = self.DATASET_MAP[dataset_name]
+
+        # 動態導入配置
+        config_module_obj = __import__(config_module, fromlist=[config_class_name])
+        config_class = getattr(config_module_obj, config_class_name)
+
+        # 驗證配置
+        errors = config_class.validate_base_config()
+        if errors:
+            return None, errors
+
+        # 創建上傳器（沿用本次預覽的掃描結果）
+        uploader = uploader_class(logger=self.logger)
+        scan_result = self._scan_results.get(dataset_name)
+        if scan_result is not None:
+            uploader.adopt_scan_result(scan_result)
+        return uploader, []
+
     def initialize_uploaders(self) -> bool:
         """
         初始化選定的上傳器
+        各資料集彼此獨立，因此並行驗證與建立，並一次顯示所有錯誤
 
         Returns:
             是否成功
@@ -673,33 +779,51 @@ class IntegrationUploadCLI:
         print("\n正在初始化上傳器...")
         self.uploaders = []
 
-        for dataset_name in self.selected_datasets:
-            try:
-                uploader_class, config_module, config_class_name = self.DATASET_MAP[dataset_name]
-
-                # 動態導入配置
-                config_module_obj = __import__(config_module, fromlist=[config_class_name])
-                config_class = getattr(config_module_obj, config_class_name)
-
-                # 驗證配置
-                errors = config_class.validate_base_config()
-                if errors:
-                    print(f"\n❌ {dataset_name} 配置錯誤：")
-                    for error in errors:
-                        print(f"  - {error}")
-                    return False
+        results: Dict[str, Tuple[Any, List[str]]] = {}
+        failures: Dict[str, Exception] = {}
 
-                # 創建上傳器
-                uploader = uploader_class(logger=self.logger)
-                self.uploaders.append((dataset_name, uploader))
-                print(f"  ✓ {dataset_name} 上傳器已初始化")
+        with ThreadPoolExecutor(max_workers=max(len(self.selected_datasets), 1)) as executor:
+            futures = {
+                executor.submit(self._init_one, dataset_name): dataset_name
+                for dataset_name in self.selected_datasets
+            }
+            for future in as_completed(futures):
+                dataset_name = futures[future]
+                try:
+                    results[dataset_name] = future.result()
+                except Exception as e:
+                    failures[dataset_name] = e
 
-            except Exception as e:
-                print(f"\n❌ 初始化 {dataset_name} 上傳器失敗：{e}")
-                self.logger.error(f"初始化 {dataset_name} 上傳器失敗：{e}")
-                return False
+        # 依原始順序輸出結果
+        success = True
+        for dataset_name in self.selected_datasets:
+            if dataset_name in failures:
+                print(f"\n❌ 初始化 {dataset_name} 上傳器失敗：{failures[dataset_name]}")
+                self.logger.error(f"初始化 {dataset_name} 上傳器失敗：{failures[dataset_name]}")
+                success = False
+                continue
+
+            uploader, errors = results[dataset_name]
+            if errors:
+                print(f"\n❌ {dataset_name} 配置錯誤：")
+                for error in errors:
+                    print(f"  - {error}")
+                success = False
+                continue
+
+            self.uploaders.append((dataset_name, uploader))
+            print(f"  ✓ {dataset_name} 上傳器已初始化")
+
+        if not success:
+            # 釋放已建立的連線
+            for _, uploader in self.uploaders:
+                try:
+                    uploader.cleanup()
+                except Exception:
+                    pass
+            self.uploaders = []
 
-        return True
+        return success
 
     def run_upload(self, dry_run: bool) -> None:
         """
@@ -713,6 +837,9 @@ class IntegrationUploadCLI:
         print(f"開始執行 {mode_text}")
         print(f"{'=' * 70}\n")
 
+        # 預覽的掃描結果只供本次上傳使用
+        self._scan_results.clear()
+
         for dataset_name, uploader in self.uploaders:
             print(f"\n>>> 處理 {dataset_name} 資料集...")
             print("-" * 70)
@@ -766,7 +893,7 @@ class IntegrationUploadCLI:
     def save_combined_report(self) -> None:
         """保存合併的報告"""
         try:
-            report_dir = Path(BaseUploadConfig.REPORT_OUTPUT['report_directory'])
+            report_dir = self._report_dir
             report_dir.mkdir(parents=True, exist_ok=True)
 
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -784,8 +911,7 @@ class IntegrationUploadCLI:
                 'dataset_statistics': self.total_stats['datasets'],
             }
 
-            with report_file.open('w', encoding='utf-8') as f:
-                json.dump(report_payload, f, indent=2, ensure_ascii=False)
+            write_json_file(report_file, report_payload)
 
             self.logger.info(f"已儲存合併報告：{report_file}")
             print(f"\n報告已保存至：{report_file}")
@@ -5,6 +5,7 @@ CPC 資料集上傳器
 
 from __future__ import annotations
 
+import io
 import logging
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
@@ -13,6 +14,7 @@ import soundfile as sf
 
 from ..core.base_uploader import BaseBatchUploader
 from ..config.cpc_config import CPCUploadConfig
+from ..core.utils import parse_wav_header, read_wav_header
 
 
 class CPCBatchUploader(BaseBatchUploader):
@@ -26,6 +28,19 @@ class CPCBatchUploader(BaseBatchUploader):
             dataset_name="CPC"
         )
         self.default_label = CPCUploadConfig.DEFAULT_LABEL
+        # 資料夾名稱（小寫）-> 標籤
+        self._label_folder_map = {
+            folder_name.lower(): label
+            for label, folder_name in CPCUploadConfig.LABEL_FOLDERS.items()
+        }
+        # 每個檔案都會用到的驗證設定
+        self._expected_rate = CPCUploadConfig.AUDIO_CONFIG.get('expected_sample_rate_hz')
+        self._allow_mono_only = CPCUploadConfig.AUDIO_CONFIG.get('allow_mono_only', False)
+        # 每個檔案的 info_features 都相同的固定欄位
+        self._dataset_uuid = CPCUploadConfig.DATASET_CONFIG['dataset_UUID']
+        self._device_id = CPCUploadConfig.DEVICE_ID
+        self._obj_id = CPCUploadConfig.DATASET_CONFIG['obj_ID']
+        self._target_channel = CPCUploadConfig.TARGET_CHANNEL
 
     def scan_directory(self) -> List[Tuple[Path, str, Optional[Dict[str, Any]]]]:
         """
@@ -33,7 +48,7 @@ class CPCBatchUploader(BaseBatchUploader):
         CPC 資料夾結構簡單，所有檔案使用相同標籤
 
         Returns:
-            List of (file_path, label, None) tuples
+            List of (file_path, label, None) tuples（檔案大小記錄於 _scan_stats，不另建字典）
         """
         directory_path = Path(self.config.UPLOAD_DIRECTORY)
         self.logger.info(f"正在掃描資料夾：{directory_path}")
@@ -43,11 +58,10 @@ class CPCBatchUploader(BaseBatchUploader):
             return []
 
         files: List[Tuple[Path, str, Optional[Dict[str, Any]]]] = []
-        for ext in self.config.SUPPORTED_FORMATS:
-            for file_path in directory_path.rglob(f"*{ext}"):
-                if file_path.is_file():
-                    label = self._determine_label(file_path)
-                    files.append((file_path, label, None))
+        for entry in self._iter_supported_files(directory_path):
+            file_path = Path(entry.path)
+            label = self._determine_label(file_path)
+            files.append((file_path, label, None))
 
         self.logger.info(f"共找到 {len(files)} 個音訊檔案。")
         return files
@@ -63,9 +77,12 @@ class CPCBatchUploader(BaseBatchUploader):
         Returns:
             標籤字串
         """
-        path_parts = [part.lower() for part in file_path.parts]
-        for label, folder_name in self.config.LABEL_FOLDERS.items():
-            if folder_name.lower() in path_parts:
+        if not self._label_folder_map:
+            return self.default_label
+
+        for part in file_path.parts:
+            label = self._label_folder_map.get(part.lower())
+            if label:
                 return label
         return self.default_label
 
@@ -73,7 +90,8 @@ class CPCBatchUploader(BaseBatchUploader):
         self,
         file_path: Path,
         label: str,
-        path_metadata: Optional[Dict[str, Any]]
+        path_metadata: Optional[Dict[str, Any]],
+        file_data: Optional[bytes] = None
     ) -> Dict[str, Any]:
         """
         取得 CPC 音訊檔案元數據
@@ -82,12 +100,13 @@ class CPCBatchUploader(BaseBatchUploader):
             file_path: 檔案路徑
             label: 標籤
             path_metadata: 路徑元數據（CPC 不使用）
+            file_data: 已讀入的檔案內容（可選）
 
         Returns:
             檔案元數據字典
         """
         metadata: Dict[str, Any] = {
-            'file_size': file_path.stat().st_size,
+            'file_size': self._resolve_file_size(file_path, path_metadata, file_data),
             'duration': None,
             'sample_rate': None,
             'channels': None,
@@ -96,26 +115,31 @@ class CPCBatchUploader(BaseBatchUploader):
         }
 
         try:
-            info = sf.info(str(file_path))
-            metadata.update({
-                'duration': float(info.duration),
-                'sample_rate': info.samplerate,
-                'channels': info.channels,
-                'subtype': info.subtype,
-                'format': info.format,
-            })
+            # CPC 錄音為固定格式的 WAV，先直接解析標頭，非標準標頭才交給 soundfile
+            wav_info = parse_wav_header(read_wav_header(file_path, file_data), metadata['file_size'])
+            if wav_info is not None:
+                metadata.update(wav_info)
+            else:
+                info = sf.info(io.BytesIO(file_data) if file_data is not None else str(file_path))
+                metadata.update({
+                    'duration': float(info.duration),
+                    'sample_rate': info.samplerate,
+                    'channels': info.channels,
+                    'subtype': info.subtype,
+                    'format': info.format,
+                })
         except Exception as exc:
             self.logger.warning(f"無法讀取音訊中繼資料 {file_path.name}：{exc}")
 
         # 驗證取樣率
-        expected_rate = self.config.AUDIO_CONFIG.get('expected_sample_rate_hz')
+        expected_rate = self._expected_rate
         if expected_rate and metadata['sample_rate'] and metadata['sample_rate'] != expected_rate:
             self.logger.warning(
                 f"取樣率不符 {file_path.name}：預期 {expected_rate} Hz，實際 {metadata['sample_rate']} Hz"
             )
 
         # 驗證聲道數
-        if self.config.AUDIO_CONFIG.get('allow_mono_only', False) and metadata['channels']:
+        if self._allow_mono_only and metadata['channels']:
             if metadata['channels'] != 1:
                 self.logger.warning(
                     f"偵測到非單聲道檔案：{file_path.name}（{metadata['channels']} 聲道）"
@@ -141,10 +165,10 @@ class CPCBatchUploader(BaseBatchUploader):
             info_features 字典
         """
         info_features: Dict[str, Any] = {
-            "dataset_UUID": self.config.DATASET_CONFIG['dataset_UUID'],
-            "device_id": self.config.DEVICE_ID,
+            "dataset_UUID": self._dataset_uuid,
+            "device_id": self._device_id,
             "testing": False,
-            "obj_ID": self.config.DATASET_CONFIG['obj_ID'],
+            "obj_ID": self._obj_id,
             "upload_complete": True,
             "file_hash": file_hash,
             "file_size": file_metadata.get('file_size'),
@@ -159,7 +183,7 @@ class CPCBatchUploader(BaseBatchUploader):
         }
 
         # 添加 target_channel
-        if self.config.TARGET_CHANNEL is not None:
-            info_features['target_channel'] = self.config.TARGET_CHANNEL
+        if self._target_channel is not None:
+            info_features['target_channel'] = self._target_channel
 
         return info_features
@@ -5,7 +5,9 @@ MAFAULDA 資料集上傳器
 
 from __future__ import annotations
 
+import io
 import logging
+import re
 from collections import OrderedDict, deque
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
@@ -13,10 +15,21 @@ from typing import Any, Dict, List, Optional, Tuple
 from ..core.base_uploader import BaseBatchUploader
 from ..config.mafaulda_config import MAFAULDAUploadConfig
 
+# str.strip() 會移除的 ASCII 空白字元（含 \x1c-\x1f 分隔字元）
+_ASCII_WHITESPACE = frozenset(b' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f')
+# 中間只含空白的列
+_BLANK_LINE_PATTERN = re.compile(rb'\n[ \t\r\x0b\x0c\x1c-\x1f]*\n')
+
 
 class MAFAULDABatchUploader(BaseBatchUploader):
     """MAFAULDA 資料集批次上傳器"""
 
+    # 掃描時累計的額外統計
+    SCAN_STATS_KEYS = ('filtered_invalid_label',)
+
+    # CSV 元數據需逐行計算取樣點數
+    METADATA_READS_CONTENT = True
+
     def __init__(self, logger: logging.Logger) -> None:
         """初始化 MAFAULDA 上傳器"""
         super().__init__(
@@ -26,6 +39,18 @@ class MAFAULDABatchUploader(BaseBatchUploader):
         )
         # 額外統計
         self.stats['filtered_invalid_label'] = 0
+        # 資料夾名稱（小寫）-> 標籤
+        self._label_folder_map = {
+            folder_name.lower(): label_key
+            for label_key, folder_name in self.config.LABEL_FOLDERS.items()
+        }
+        # 每個檔案都會用到的 CSV 設定
+        self._sample_rate_hz = self.config.CSV_CONFIG.get('sample_rate_hz')
+        self._expected_channels = self.config.CSV_CONFIG.get('expected_channels')
+        # 每個檔案的 info_features 都相同的固定欄位
+        self._dataset_uuid = self.config.DATASET_CONFIG['dataset_UUID']
+        self._obj_id = self.config.DATASET_CONFIG['obj_ID']
+        self._target_channel = self.config.ANALYSIS_CONFIG.get('target_channel')
 
     def scan_directory(self) -> List[Tuple[Path, str, Optional[Dict[str, Any]]]]:
         """
@@ -40,23 +65,18 @@ class MAFAULDABatchUploader(BaseBatchUploader):
         directory_path = Path(self.config.UPLOAD_DIRECTORY)
         dataset_files: List[Tuple[Path, str, Optional[Dict[str, Any]]]] = []
 
-        # 遞迴掃描
-        for ext in self.config.SUPPORTED_FORMATS:
-            for file_path in directory_path.rglob(f"*{ext}"):
-                if file_path.is_file():
-                    label, path_metadata = self._analyze_file_path(file_path)
-                    if label == 'unknown':
-                        try:
-                            rel_path = file_path.relative_to(directory_path)
-                        except ValueError:
-                            rel_path = file_path
-                        self.logger.warning(
-                            f"忽略未在 LABEL_FOLDERS 設定中的子資料夾檔案：{rel_path}"
-                        )
-                        self.stats['filtered_invalid_label'] += 1
-                        continue
-
-                    dataset_files.append((file_path, label, path_metadata))
+        # 遞迴掃描（單次走訪）
+        for entry in self._iter_supported_files(directory_path):
+            file_path = Path(entry.path)
+            label, path_metadata = self._analyze_file_path(file_path)
+            if label == 'unknown':
+                self.logger.warning(
+                    f"忽略未在 LABEL_FOLDERS 設定中的子資料夾檔案：{path_metadata['relative_path']}"
+                )
+                self.stats['filtered_invalid_label'] += 1
+                continue
+
+            dataset_files.append((file_path, label, path_metadata))
 
         self.logger.info(f"找到 {len(dataset_files)} 個資料檔案")
         return dataset_files
@@ -72,27 +92,17 @@ class MAFAULDABatchUploader(BaseBatchUploader):
         Returns:
             (label, path_metadata) tuple
         """
-        base_path = Path(self.config.UPLOAD_DIRECTORY)
-        try:
-            relative = file_path.relative_to(base_path)
-        except ValueError:
-            relative = file_path
-
-        parts = relative.parts
-        folder_map = {
-            folder_name.lower(): label_key
-            for label_key, folder_name in self.config.LABEL_FOLDERS.items()
-        }
+        relative_path, parts = self._split_relative_path(file_path)
 
         label = 'unknown'
         if parts:
-            label = folder_map.get(parts[0].lower(), 'unknown')
+            label = self._label_folder_map.get(parts[0].lower(), 'unknown')
 
         # 提取故障層級（排除第一層和檔名）
         fault_hierarchy = list(parts[1:-1]) if len(parts) > 1 else []
 
         metadata: Dict[str, Any] = {
-            'relative_path': str(relative).replace("\\", "/"),
+            'relative_path': relative_path,
         }
         if label != 'unknown':
             metadata['fault_type'] = label
@@ -129,7 +139,8 @@ class MAFAULDABatchUploader(BaseBatchUploader):
         self,
         file_path: Path,
         label: str,
-        path_metadata: Optional[Dict[str, Any]]
+        path_metadata: Optional[Dict[str, Any]],
+        file_data: Optional[bytes] = None
     ) -> Dict[str, Any]:
         """
         取得 MAFAULDA CSV 檔案元數據
@@ -138,13 +149,14 @@ class MAFAULDABatchUploader(BaseBatchUploader):
             file_path: 檔案路徑
             label: 標籤
             path_metadata: 路徑元數據
+            file_data: 已讀入的檔案內容（可選）
 
         Returns:
             檔案元數據字典
         """
         metadata: Dict[str, Any] = {
-            'file_size': file_path.stat().st_size,
-            'sample_rate_hz': self.config.CSV_CONFIG.get('sample_rate_hz'),
+            'file_size': self._resolve_file_size(file_path, path_metadata, file_data),
+            'sample_rate_hz': self._sample_rate_hz,
         }
 
         # 合併路徑元數據
@@ -152,7 +164,7 @@ class MAFAULDABatchUploader(BaseBatchUploader):
             metadata.update(path_metadata)
 
         # 解析 CSV 檔案
-        csv_metadata = self._get_csv_metadata(file_path)
+        csv_metadata = self._get_csv_metadata(file_path, file_data)
         metadata.update(csv_metadata)
 
         # 計算 duration（如果尚未計算）
@@ -161,20 +173,75 @@ class MAFAULDABatchUploader(BaseBatchUploader):
 
         return metadata
 
-    def _get_csv_metadata(self, file_path: Path) -> Dict[str, Any]:
-        """解析 CSV 檔案的取樣點數與欄位數"""
+    @staticmethod
+    def _count_csv_rows(data: bytes) -> Tuple[int, Optional[int]]:
+        """
+        計算 CSV 的非空白列數與第一列的欄位數（與以文字模式逐行 strip 的結果相同）
+        一般的 ASCII 內容交給 bytes.count（C 實作的 memchr 迴圈）計算換行數；含非 ASCII 位元組、
+        單獨的 \\r 換行或中間有空白列時，改以文字模式逐行判斷
+
+        Args:
+            data: CSV 檔案內容
+
+        Returns:
+            (列數, 欄位數) tuple，沒有資料列時欄位數為 None
+        """
+        if (not data.isascii()
+                or data.count(b'\r') != data.count(b'\r\n')
+                or _BLANK_LINE_PATTERN.search(data) is not None):
+            return MAFAULDABatchUploader._count_csv_lines(data)
+
+        # 以索引略過開頭與結尾的空白（與文字模式 str.strip 相同的 ASCII 字元），不複製整份內容
+        start, end = 0, len(data)
+        while start < end and data[start] in _ASCII_WHITESPACE:
+            start += 1
+        while end > start and data[end - 1] in _ASCII_WHITESPACE:
+            end -= 1
+        if start >= end:
+            return 0, None
+
+        first_newline = data.find(b'\n', start, end)
+        first_line = data[start:end if first_newline == -1 else first_newline]
+        num_channels = first_line.count(b',') + 1
+
+        # 已排除單獨的 \r 與中間空白列：每個換行之間都是一筆資料列
+        num_samples = data.count(b'\n', start, end) + 1
+        return num_samples, num_channels
+
+    @staticmethod
+    def _count_csv_lines(data: bytes) -> Tuple[int, Optional[int]]:
+        """
+        以文字模式（UTF-8、忽略無法解碼的位元組、通用換行）逐行計算非空白列數與第一列的欄位數
+
+        Args:
+            data: CSV 檔案內容
+
+        Returns:
+            (列數, 欄位數) tuple，沒有資料列時欄位數為 None
+        """
         num_samples = 0
         num_channels: Optional[int] = None
+        for line in io.TextIOWrapper(io.BytesIO(data), encoding='utf-8', errors='ignore'):
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if num_channels is None:
+                num_channels = len(stripped.split(','))
+            num_samples += 1
+        return num_samples, num_channels
+
+    def _get_csv_metadata(self, file_path: Path, file_data: Optional[bytes] = None) -> Dict[str, Any]:
+        """
+        解析 CSV 檔案的取樣點數與欄位數（提供 file_data 時直接解析記憶體內容）
+        以位元組層級的 count/find（memchr）計算列數，不解碼、不逐行建立字串
+        """
+        num_channels: Optional[int] = None
 
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                for line in f:
-                    stripped = line.strip()
-                    if not stripped:
-                        continue
-                    if num_channels is None:
-                        num_channels = len(stripped.split(','))
-                    num_samples += 1
+            if file_data is None:
+                with open(file_path, 'rb') as f:
+                    file_data = f.read()
+            num_samples, num_channels = self._count_csv_rows(file_data)
         except Exception as e:
             self.logger.warning(f"無法解析 CSV 檔案 {file_path.name}：{e}")
             return {
@@ -188,14 +255,14 @@ class MAFAULDABatchUploader(BaseBatchUploader):
             'num_channels': num_channels,
         }
 
-        sample_rate = self.config.CSV_CONFIG.get('sample_rate_hz')
+        sample_rate = self._sample_rate_hz
         if sample_rate and num_samples:
             metadata['duration'] = num_samples / sample_rate
         else:
             metadata['duration'] = None
 
         # 驗證欄位數
-        expected_channels = self.config.CSV_CONFIG.get('expected_channels')
+        expected_channels = self._expected_channels
         if expected_channels and num_channels and num_channels != expected_channels:
             self.logger.warning(
                 f"CSV 欄位數異常 {file_path.name}：期望 {expected_channels}，實際 {num_channels}"
@@ -239,10 +306,10 @@ class MAFAULDABatchUploader(BaseBatchUploader):
             mafaulda_metadata['rotational_speed_rpm'] = file_metadata['rotational_speed_rpm']
 
         info_features: Dict[str, Any] = {
-            "dataset_UUID": self.config.DATASET_CONFIG['dataset_UUID'],
+            "dataset_UUID": self._dataset_uuid,
             "device_id": f'Mafaulda_{label.upper()}',
             "testing": False,
-            "obj_ID": self.config.DATASET_CONFIG['obj_ID'],
+            "obj_ID": self._obj_id,
             "upload_complete": True,
             "file_hash": file_hash,
             "file_size": file_metadata.get('file_size'),
@@ -255,7 +322,7 @@ class MAFAULDABatchUploader(BaseBatchUploader):
         }
 
         # 添加 target_channel
-        target_channel = self.config.ANALYSIS_CONFIG.get('target_channel')
+        target_channel = self._target_channel
         if target_channel is not None:
             info_features['target_channel'] = target_channel
 
@@ -5,7 +5,10 @@ MIMII 資料集上傳器
 
 from __future__ import annotations
 
+import io
 import logging
+import os
+import re
 from collections import OrderedDict, deque
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
@@ -14,11 +17,15 @@ import soundfile as sf
 
 from ..core.base_uploader import BaseBatchUploader
 from ..config.mimii_config import MIMIIUploadConfig
+from ..core.utils import parse_wav_header, read_wav_header
 
 
 class MIMIIBatchUploader(BaseBatchUploader):
     """MIMII 資料集批次上傳器"""
 
+    # 掃描時累計的額外統計
+    SCAN_STATS_KEYS = ('filtered_invalid_label',)
+
     def __init__(self, logger: logging.Logger) -> None:
         """初始化 MIMII 上傳器"""
         super().__init__(
@@ -28,6 +35,20 @@ class MIMIIBatchUploader(BaseBatchUploader):
         )
         # 額外統計
         self.stats['filtered_invalid_label'] = 0
+        # 資料夾名稱（小寫）-> 標籤
+        self._label_folder_map = {
+            folder_name.lower(): label_key
+            for label_key, folder_name in self.config.LABEL_FOLDERS.items()
+        }
+        # 每個檔案都會用到的設定
+        self._machine_types = tuple(self.config.MACHINE_TYPES)
+        # 標準目錄結構 {snr}_dB_{machine_type}/{machine_type}/{obj_ID}/{label}/{filename} 的相對路徑，
+        # 一次比對取出 SNR、機器類型、obj_ID 與標籤資料夾；不符合時改用逐層解析
+        self._layout_pattern = re.compile(
+            r'(-?\d+_dB)_(' + '|'.join(map(re.escape, self._machine_types)) + r')/\2/(id_[^/]*)/([^/]+)/[^/]+'
+        )
+        self._dataset_uuid = self.config.DATASET_CONFIG['dataset_UUID']
+        self._target_channel = self.config.ANALYSIS_CONFIG.get('target_channel')
 
     def scan_directory(self) -> List[Tuple[Path, str, Optional[Dict[str, Any]]]]:
         """
@@ -42,27 +63,40 @@ class MIMIIBatchUploader(BaseBatchUploader):
         directory_path = Path(self.config.UPLOAD_DIRECTORY)
         dataset_files: List[Tuple[Path, str, Optional[Dict[str, Any]]]] = []
 
-        # 遞迴掃描
-        for ext in self.config.SUPPORTED_FORMATS:
-            for file_path in directory_path.rglob(f"*{ext}"):
-                if file_path.is_file():
-                    label, path_metadata = self._analyze_file_path(file_path)
-                    if label == 'unknown':
-                        try:
-                            rel_path = file_path.relative_to(directory_path)
-                        except ValueError:
-                            rel_path = file_path
-                        self.logger.warning(
-                            f"忽略未在 LABEL_FOLDERS 設定中的子資料夾檔案：{rel_path}"
-                        )
-                        self.stats['filtered_invalid_label'] += 1
-                        continue
-
-                    dataset_files.append((file_path, label, path_metadata))
+        # 遞迴掃描（單次走訪）
+        for entry in self._iter_supported_files(directory_path):
+            file_path = Path(entry.path)
+            label, path_metadata = self._analyze_file_path(file_path)
+            if label == 'unknown':
+                self.logger.warning(
+                    f"忽略未在 LABEL_FOLDERS 設定中的子資料夾檔案：{path_metadata['relative_path']}"
+                )
+                self.stats['filtered_invalid_label'] += 1
+                continue
+
+            dataset_files.append((file_path, label, path_metadata))
 
         self.logger.info(f"找到 {len(dataset_files)} 個音頻檔案")
         return dataset_files
 
+    def _is_leaf_folder(self, folder: str) -> bool:
+        """
+        第四層的標籤資料夾（{snr}_{machine_type}/{machine_type}/{obj_ID}/{label}/）只放音訊檔，
+        走訪到此即不再往下讀取子資料夾
+
+        Args:
+            folder: 資料夾路徑
+
+        Returns:
+            是否為標籤資料夾
+        """
+        prefix = self._upload_dir_prefix
+        if not folder.startswith(prefix):
+            return False
+        # 掃描時的資料夾路徑皆位於上傳資料夾內，以字串計算層數，不建立 Path 物件
+        relative = folder[len(prefix):]
+        return relative.count(os.sep) == 3 and relative.rsplit(os.sep, 1)[-1].lower() in self._label_folder_map
+
     def _analyze_file_path(self, file_path: Path) -> Tuple[str, Dict[str, Any]]:
         """
         從路徑解析 MIMII 資料的參數
@@ -75,28 +109,29 @@ class MIMIIBatchUploader(BaseBatchUploader):
         Returns:
             (label, path_metadata) tuple
         """
-        base_path = Path(self.config.UPLOAD_DIRECTORY)
-        try:
-            relative = file_path.relative_to(base_path)
-        except ValueError:
-            relative = file_path
-
-        parts = relative.parts
+        relative_path, parts = self._split_relative_path(file_path)
 
         # 初始化元數據
         metadata: Dict[str, Any] = {
-            'relative_path': str(relative).replace("\\", "/"),
+            'relative_path': relative_path,
         }
 
         label = 'unknown'
 
         # MIMII 路徑結構：{snr}_{machine_type}/{machine_type}/{obj_ID}/{label}/{filename}
-        if len(parts) >= 4:
+        layout_match = self._layout_pattern.fullmatch(relative_path)
+        if layout_match:
+            snr, machine_type, obj_id, label_folder = layout_match.groups()
+            metadata['machine_type'] = machine_type
+            metadata['snr'] = snr
+            metadata['obj_ID'] = obj_id
+            label = self._label_folder_map.get(label_folder.lower(), 'unknown')
+        elif len(parts) >= 4:
             # 第一層：提取 SNR 和機器類型
             first_level = parts[0]  # e.g., "6_dB_pump"
 
             # 解析 SNR 和機器類型
-            for machine_type in self.config.MACHINE_TYPES:
+            for machine_type in self._machine_types:
                 if machine_type in first_level.lower():
                     metadata['machine_type'] = machine_type
                     # 提取 SNR（移除機器類型部分）
@@ -111,11 +146,7 @@ class MIMIIBatchUploader(BaseBatchUploader):
 
             # 第四層：標籤
             if len(parts) >= 4:
-                label_folder = parts[3].lower()
-                for label_key, folder_name in self.config.LABEL_FOLDERS.items():
-                    if folder_name.lower() == label_folder:
-                        label = label_key
-                        break
+                label = self._label_folder_map.get(parts[3].lower(), 'unknown')
 
         # 從檔案名稱提取序號
         filename = file_path.stem
@@ -132,7 +163,8 @@ class MIMIIBatchUploader(BaseBatchUploader):
         self,
         file_path: Path,
         label: str,
-        path_metadata: Optional[Dict[str, Any]]
+        path_metadata: Optional[Dict[str, Any]],
+        file_data: Optional[bytes] = None
     ) -> Dict[str, Any]:
         """
         取得 MIMII 音訊檔案元數據
@@ -141,25 +173,33 @@ class MIMIIBatchUploader(BaseBatchUploader):
             file_path: 檔案路徑
             label: 標籤
             path_metadata: 路徑元數據
+            file_data: 已讀入的檔案內容（可選）
 
         Returns:
             檔案元數據字典
         """
         metadata: Dict[str, Any] = {
-            'file_size': file_path.stat().st_size,
+            'file_size': self._resolve_file_size(file_path, path_metadata, file_data),
         }
 
         # 合併路徑元數據
         if path_metadata:
             metadata.update(path_metadata)
 
-        # 獲取音頻資訊
+        # 獲取音頻資訊（標準 WAV 標頭直接解析，只讀取檔案開頭；非標準標頭才交給 soundfile 開啟）
         try:
-            info = sf.info(str(file_path))
-            metadata['duration'] = info.duration
-            metadata['sample_rate'] = info.samplerate
-            metadata['channels'] = info.channels
-            metadata['raw_format'] = info.format
+            wav_info = parse_wav_header(read_wav_header(file_path, file_data), metadata['file_size'])
+            if wav_info is not None:
+                metadata['duration'] = wav_info['duration']
+                metadata['sample_rate'] = wav_info['sample_rate']
+                metadata['channels'] = wav_info['channels']
+                metadata['raw_format'] = wav_info['format']
+            else:
+                info = sf.info(io.BytesIO(file_data) if file_data is not None else str(file_path))
+                metadata['duration'] = info.duration
+                metadata['sample_rate'] = info.samplerate
+                metadata['channels'] = info.channels
+                metadata['raw_format'] = info.format
         except Exception as e:
             self.logger.warning(f"無法讀取音頻資訊 {file_path.name}：{e}")
             metadata['duration'] = 0.0
@@ -206,7 +246,7 @@ class MIMIIBatchUploader(BaseBatchUploader):
         obj_id = file_metadata.get('obj_ID', '-1')
 
         info_features: Dict[str, Any] = {
-            "dataset_UUID": self.config.DATASET_CONFIG['dataset_UUID'],
+            "dataset_UUID": self._dataset_uuid,
             "device_id": f"Mimii_{label.upper()}",
             "testing": False,
             "obj_ID": obj_id,
@@ -222,7 +262,7 @@ class MIMIIBatchUploader(BaseBatchUploader):
         }
 
         # 添加 target_channel
-        target_channel = self.config.ANALYSIS_CONFIG.get('target_channel')
+        target_channel = self._target_channel
         if target_channel is not None:
             info_features['target_channel'] = target_channel
 
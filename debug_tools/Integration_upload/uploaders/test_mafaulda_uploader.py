@@ -0,0 +1,47 @@
+"""
+測試 MAFAULDA CSV 列數計算與文字模式逐行 strip 的結果一致
+"""
+
+import io
+
+import pytest
+
+pytest.importorskip('pymongo')
+pytest.importorskip('tqdm')
+
+from .mafaulda_uploader import MAFAULDABatchUploader
+
+
+def _count_text_mode(data: bytes):
+    """以文字模式逐行 strip 計算列數與欄位數（原本的實作）"""
+    num_samples = 0
+    num_channels = None
+    for line in io.TextIOWrapper(io.BytesIO(data), encoding='utf-8', errors='ignore'):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if num_channels is None:
+            num_channels = len(stripped.split(','))
+        num_samples += 1
+    return num_samples, num_channels
+
+
+@pytest.mark.parametrize('data', [
+    b'',
+    b' \n \r\n',
+    b'a,b\n1,2\n3,4\n',
+    b'a,b\r\n1,2\r\n3,4',
+    b'\n\na,b\n1,2\n\n',
+    b'a,b\n\n1,2\n',
+    b'a,b\n\r\n1,2\n',
+    b'a,b\n \n1,2',
+    b'a,b\n\t\n1,2\n',
+    b'a,b\r1,2\r3,4',
+    b'a,b\r1,2\n3,4\r\n',
+    b'a,b\n\x1c\n1,2\n',
+    b'a,b\n\xc2\xa0\n1,2\n',
+    b'a,b\n\xff\n1,2\n',
+])
+def test_count_csv_rows_matches_text_mode(data):
+    """各種換行與空白列組合的列數、欄位數與文字模式相同"""
+    assert MAFAULDABatchUploader._count_csv_rows(data) == _count_text_mode(data)
@@ -0,0 +1,139 @@
+"""
+測試 MIMII 上傳器的目錄掃描（末端資料夾剪枝）、路徑解析與音訊元數據
+"""
+
+import os
+import struct
+from pathlib import Path
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from ..config.mimii_config import MIMIIUploadConfig
+from . import mimii_uploader as mimii_uploader_module
+from .mimii_uploader import MIMIIBatchUploader
+
+
+def _write_wav(path: Path, frames: int = 160, sample_rate: int = 16000) -> None:
+    """寫入一個標準 PCM_16 WAV 檔案"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    sf.write(str(path), np.zeros(frames, dtype=np.int16), sample_rate, subtype='PCM_16')
+
+
+@pytest.fixture
+def mimii_tree(tmp_path: Path) -> Path:
+    """
+    建立小型 MIMII 目錄：兩個標籤資料夾、一個未設定的標籤資料夾，
+    以及標籤資料夾下不應被走訪的子資料夾
+    """
+    root = tmp_path / 'mimii'
+    machine = root / '6_dB_pump' / 'pump' / 'id_00'
+    _write_wav(machine / 'normal' / '00000001.wav')
+    _write_wav(machine / 'abnormal' / '00000002.wav')
+    _write_wav(machine / 'unlabeled' / '00000003.wav')
+    _write_wav(machine / 'normal' / 'nested' / '00000004.wav')
+    return root
+
+
+@pytest.mark.parametrize('relative_upload_dir', [False, True])
+def test_scan_prunes_label_folders(make_uploader, monkeypatch, mimii_tree, relative_upload_dir):
+    """絕對路徑與 '.' 上傳資料夾都會在標籤資料夾停止走訪，且掃描的 stat 結果可直接供雜湊快取使用"""
+    if relative_upload_dir:
+        monkeypatch.chdir(mimii_tree)
+        upload_dir = '.'
+    else:
+        upload_dir = str(mimii_tree)
+    uploader = make_uploader(MIMIIBatchUploader, MIMIIUploadConfig, upload_dir)
+
+    files = uploader.scan_directory()
+
+    found = {path_metadata['relative_path']: label for _, label, path_metadata in files}
+    assert found == {
+        '6_dB_pump/pump/id_00/normal/00000001.wav': 'normal',
+        '6_dB_pump/pump/id_00/abnormal/00000002.wav': 'abnormal',
+    }
+    assert uploader.stats['filtered_invalid_label'] == 1
+
+    for file_path, _, path_metadata in files:
+        # 掃描時的鍵值與之後以 Path 查詢的字串相同，不需再次 stat
+        assert os.fspath(file_path) in uploader._scan_stats
+        absolute_path, file_size, _ = uploader._hash_cache_key(file_path)
+        assert absolute_path == os.path.join(str(mimii_tree), *path_metadata['relative_path'].split('/'))
+        assert file_size == file_path.stat().st_size
+
+
+def test_folder_cap_only_applies_to_label_folders(make_uploader, mimii_tree):
+    """per_label_limit 只限制標籤資料夾的讀取數量，無效標籤的檔案不佔用名額且全數計入過濾統計"""
+    machine = mimii_tree / '6_dB_pump' / 'pump' / 'id_00'
+    _write_wav(machine / 'normal' / '00000005.wav')
+    _write_wav(machine / 'unlabeled' / '00000006.wav')
+    uploader = make_uploader(MIMIIBatchUploader, MIMIIUploadConfig, str(mimii_tree), per_label_limit=1)
+
+    files = uploader.scan_directory()
+
+    assert sorted(label for _, label, _ in files) == ['abnormal', 'normal']
+    assert uploader.stats['filtered_invalid_label'] == 2
+    assert uploader.caps_leaf_folder_files
+
+
+@pytest.mark.parametrize('relative_path, expected_label, expected_metadata', [
+    ('6_dB_pump/pump/id_02/normal/00000001.wav', 'normal',
+     {'snr': '6_dB', 'machine_type': 'pump', 'obj_ID': 'id_02', 'file_id_number': 1}),
+    ('-6_dB_fan/fan/id_04/ABNORMAL/00000123.wav', 'abnormal',
+     {'snr': '-6_dB', 'machine_type': 'fan', 'obj_ID': 'id_04', 'file_id_number': 123}),
+    # 不符合標準結構（第一層與第二層的機器類型不同）時改以逐層解析
+    ('0_dB_valve/slider/id_00/normal/a.wav', 'normal',
+     {'snr': '0_dB', 'machine_type': 'valve', 'obj_ID': 'id_00'}),
+    ('6_dB_pump/pump/id_00/unknown_label/00000001.wav', 'unknown', {'obj_ID': 'id_00'}),
+    ('pump/normal/00000001.wav', 'unknown', {}),
+])
+def test_analyze_file_path(make_uploader, tmp_path, relative_path, expected_label, expected_metadata):
+    """標準結構由正規表示式一次解析，其他結構的結果與逐層解析一致"""
+    uploader = make_uploader(MIMIIBatchUploader, MIMIIUploadConfig, str(tmp_path))
+    file_path = tmp_path.joinpath(*relative_path.split('/'))
+
+    label, metadata = uploader._analyze_file_path(file_path)
+
+    assert label == expected_label
+    assert metadata['relative_path'] == relative_path
+    for key, value in expected_metadata.items():
+        assert metadata[key] == value
+
+
+def test_metadata_uses_header_fast_path(make_uploader, monkeypatch, tmp_path):
+    """標準 WAV 標頭直接解析，不開啟 soundfile"""
+    wav_path = tmp_path / '00000001.wav'
+    _write_wav(wav_path, frames=320, sample_rate=16000)
+    uploader = make_uploader(MIMIIBatchUploader, MIMIIUploadConfig, str(tmp_path))
+
+    def fail_info(*args, **kwargs):
+        raise AssertionError('標準標頭不應呼叫 soundfile.info')
+
+    monkeypatch.setattr(mimii_uploader_module.sf, 'info', fail_info)
+    metadata = uploader.get_file_metadata(wav_path, 'normal', None)
+
+    assert metadata['duration'] == pytest.approx(0.02)
+    assert metadata['sample_rate'] == 16000
+    assert metadata['channels'] == 1
+    assert metadata['raw_format'] == 'WAV'
+
+
+@pytest.mark.parametrize('from_memory', [False, True])
+def test_metadata_falls_back_to_soundfile(make_uploader, tmp_path, from_memory):
+    """fmt 與 data 之間有其他 chunk 時改用 soundfile，結果與標準標頭相同"""
+    wav_path = tmp_path / '00000001.wav'
+    _write_wav(wav_path, frames=320, sample_rate=16000)
+    content = wav_path.read_bytes()
+    list_chunk = struct.pack('<4sI', b'LIST', 4) + b'INFO'
+    # 標準標頭的 fmt chunk 結束於第 36 位元組，於其後插入 LIST chunk 並修正 RIFF 大小
+    content = content[:4] + struct.pack('<I', len(content) - 8 + len(list_chunk)) + content[8:36] + list_chunk + content[36:]
+    wav_path.write_bytes(content)
+    uploader = make_uploader(MIMIIBatchUploader, MIMIIUploadConfig, str(tmp_path))
+
+    metadata = uploader.get_file_metadata(wav_path, 'normal', None, content if from_memory else None)
+
+    assert metadata['duration'] == pytest.approx(0.02)
+    assert metadata['sample_rate'] == 16000
+    assert metadata['channels'] == 1
+    assert metadata['raw_format'] == 'WAV'